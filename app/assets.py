@@ -0,0 +1,139 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import stat
+import sys
+from typing import Optional
+import anyio
+from fastapi.staticfiles import StaticFiles
+from . import compression
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped without it
+    brotli = None
+
+# Fingerprinted static assets.
+#
+# `python -m app.assets build` copies every file under app/static (except
+# user uploads) to app/static/dist with a content hash in its name, writes
+# gzip and brotli variants next to the compressible ones and records the
+# mapping in dist/manifest.json. Templates call asset_url() to get the
+# fingerprinted URL, which can then be cached by browsers forever. Without
+# a build, asset_url() returns the plain /static path.
+
+STATIC_DIR = "app/static"
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+SKIP_DIRS = {"dist", "uploads"}
+COMPRESSIBLE = {".js", ".css", ".svg", ".json", ".txt", ".html", ".map", ".xml", ".ico"}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=0, must-revalidate"
+
+# Hashed file names: dist/<name>.<10 hex>.<ext> and content-addressed uploads
+_FINGERPRINTED = re.compile(r"^(dist/.+\.[0-9a-f]{10}\.[^/]+|uploads/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(-\d+)?\.[a-z]+)$")
+
+_manifest: Optional[dict] = None
+
+
+def _fingerprint(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:10]
+
+
+def _write_compressed(path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> dict:
+    """Fingerprint and precompress the static assets; returns the manifest."""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            logical = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            stem, ext = os.path.splitext(logical)
+            hashed = f"{stem}.{_fingerprint(source)}{ext}"
+            target = os.path.join(dist_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+            if ext.lower() in COMPRESSIBLE:
+                _write_compressed(target)
+            manifest[logical] = f"dist/{hashed}"
+
+    with open(os.path.join(dist_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest() -> dict:
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_PATH) as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(path: str) -> str:
+    """URL for a file under app/static, fingerprinted when a build exists."""
+    path = path.lstrip("/")
+    return "/static/" + load_manifest().get(path, path)
+
+
+def register_template_helpers(templates):
+    templates.env.globals["asset_url"] = asset_url
+
+
+class AssetStaticFiles(StaticFiles):
+    """StaticFiles that serves precompressed variants and long-lived cache headers."""
+
+    async def get_response(self, path: str, scope):
+        response = None
+        compressible = os.path.splitext(path)[1].lower() in COMPRESSIBLE
+        if compressible:
+            accepted = compression.accepted_encodings(scope)
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if encoding not in accepted:
+                    continue
+                full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    # The media type is guessed from the name without the suffix
+                    response = self.file_response(full_path, stat_result, scope)
+                    response.headers["Content-Encoding"] = encoding
+                    break
+
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if compressible:
+            response.headers["Vary"] = "Accept-Encoding"
+        if response.status_code in (200, 304):
+            response.headers["Cache-Control"] = IMMUTABLE if _FINGERPRINTED.match(path) else REVALIDATE
+        return response
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        sys.exit("usage: python -m app.assets build")
+    built = build()
+    print(f"Fingerprinted {len(built)} assets into {DIST_DIR}")
@@ -1,45 +1,225 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.responses import RedirectResponse
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Optional
-from . import schemas, database, models
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import threading
+import time
+import uuid
+from . import schemas, database, models, settings, metrics
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Configuration
 SECRET_KEY = "supersecretkey" # Change in production
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# passlib and python-jose (which pulls in cryptography) are imported on the
+# first login or token, not with the app: most workers start to serve
+# public pages and may never see an admin.
+@functools.lru_cache(maxsize=None)
+def password_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_context().hash(password)
+
+# pbkdf2 costs tens of milliseconds of CPU per call. Handlers hash on a small
+# thread pool (hashlib releases the GIL) and turn logins away once too many
+# are queued, so a burst of attempts can't starve the public pages.
+_hash_pool: Optional[ThreadPoolExecutor] = None
+_hashes_pending = 0
+
+class HasherBusy(RuntimeError):
+    pass
+
+async def _run_hasher(func, *args):
+    global _hash_pool, _hashes_pending
+    if _hashes_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HasherBusy("Too many password checks in flight")
+    if _hash_pool is None:
+        _hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="vines-hash")
+    _hashes_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, func, *args)
+    finally:
+        _hashes_pending -= 1
+
+async def check_password(plain_password, hashed_password):
+    """verify_password off the event loop; raises HasherBusy when saturated."""
+    return await _run_hasher(verify_password, plain_password, hashed_password)
+
+async def hash_password(password):
+    """get_password_hash off the event loop; raises HasherBusy when saturated."""
+    return await _run_hasher(get_password_hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    # jti keys the principal cache; iat lets revoke_admin() cut off older tokens
+    to_encode.setdefault("jti", uuid.uuid4().hex)
+    to_encode.setdefault("iat", int(time.time()))
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 # Database Auth
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(models.Admin).filter(models.Admin.username == username).first()
-    if not user:
-        return False
-    if not verify_password(password, user.password_hash):
-        return False
-    return user
+# `db` should be a read session (database.get_read_db); see the login route
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        user = (await db.execute(select(models.Admin).where(models.Admin.username == username))).scalar_one_or_none()
+        if not user:
+            outcome = "unknown_user"
+            return False
+        if not await check_password(password, user.password_hash):
+            outcome = "bad_password"
+            return False
+        outcome = "success"
+        return user
+    except HasherBusy:
+        outcome = "busy"
+        raise
+    finally:
+        metrics.LOGINS.inc(outcome=outcome)
+        metrics.LOGIN_SECONDS.observe(time.perf_counter() - started)
+
+# --- Principals ---
+# The admin behind a token, as read from the database when the token was
+# first seen. Requests reuse it for PRINCIPAL_CACHE_TTL seconds instead of
+# loading models.Admin every time; deleting an admin or changing their role
+# must call revoke_admin() so their tokens stop working straight away.
+# Other workers hear about admin changes and logouts through the "auth"
+# counter (app/coordination.py) and call reload_revocations().
+
+class Principal:
+    __slots__ = ("id", "username", "role")
+
+    def __init__(self, id: int, username: str, role: str):
+        self.id = id
+        self.username = username
+        self.role = role
+
+class PrincipalCache:
+    def __init__(self, ttl: float = settings.PRINCIPAL_CACHE_TTL, max_entries: int = settings.PRINCIPAL_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # jti -> (expires, Principal)
+        self._revoked_tokens = {}      # jti -> token expiry
+        self._revoked_admins = {}      # admin id -> revoked at (tokens issued before are void)
+        self._lock = threading.Lock()
+
+    def get(self, jti: str):
+        with self._lock:
+            entry = self._entries.get(jti)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[jti]
+                return None
+            self._entries.move_to_end(jti)
+            return entry[1]
+
+    def put(self, jti: str, principal: Principal):
+        with self._lock:
+            self._entries[jti] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, payload: dict) -> bool:
+        with self._lock:
+            if payload.get("jti") in self._revoked_tokens:
+                return True
+            revoked_at = self._revoked_admins.get(payload.get("uid"))
+            return revoked_at is not None and payload.get("iat", 0) < revoked_at
+
+    def revoke_token(self, jti: str, expires: float):
+        with self._lock:
+            self._entries.pop(jti, None)
+            self._revoked_tokens[jti] = expires
+            self._prune()
+
+    def revoke_admin(self, admin_id: int):
+        with self._lock:
+            for jti in [jti for jti, (_, p) in self._entries.items() if p.id == admin_id]:
+                del self._entries[jti]
+            self._revoked_admins[admin_id] = int(time.time())
+            self._prune()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _prune(self):
+        # Revocations only matter until the tokens they cover have expired
+        now = time.time()
+        for jti in [jti for jti, expires in self._revoked_tokens.items() if expires < now]:
+            del self._revoked_tokens[jti]
+        oldest_live = now - ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        for admin_id in [a for a, at in self._revoked_admins.items() if at < oldest_live]:
+            del self._revoked_admins[admin_id]
+
+principal_cache = PrincipalCache()
+
+def revoke_admin(admin_id: int):
+    """Invalidate every token issued so far to `admin_id` (deleted, or role changed)."""
+    principal_cache.revoke_admin(admin_id)
+
+def revoke_token(token: Optional[str]):
+    """Invalidate one token, e.g. on logout. Unreadable tokens are ignored."""
+    payload = _decode(token) if token else None
+    if payload and payload.get("jti"):
+        expires = payload.get("exp", time.time())
+        principal_cache.revoke_token(payload["jti"], expires)
+        # Persisted for the other workers; expired rows are no longer needed
+        with database.engine.begin() as conn:
+            conn.execute(delete(models.RevokedToken).where(models.RevokedToken.expires_at < time.time()))
+            conn.execute(
+                sqlite_insert(models.RevokedToken)
+                .values(jti=payload["jti"], expires_at=expires)
+                .on_conflict_do_nothing()
+            )
+
+def reload_revocations():
+    """Drop cached principals and load the logouts of every worker."""
+    with database.engine.connect() as conn:
+        rows = conn.execute(
+            select(models.RevokedToken.jti, models.RevokedToken.expires_at)
+            .where(models.RevokedToken.expires_at >= time.time())
+        ).all()
+    principal_cache.clear()
+    for jti, expires in rows:
+        principal_cache.revoke_token(jti, expires)
+
+def _decode(token: str) -> Optional[dict]:
+    # Handle "Bearer <token>" format if present in cookie
+    if token.startswith("Bearer "):
+        token = token.split(" ")[1]
+    from jose import JWTError, jwt
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
 
 def create_super_admin_if_not_exists(db: Session):
     # Check if any admin exists
@@ -49,11 +229,17 @@ def create_super_admin_if_not_exists(db: Session):
         password_hash = get_password_hash("DesignMaster2025")
         new_admin = models.Admin(username="owner", password_hash=password_hash, role="super_admin")
         db.add(new_admin)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # another process created it first
+            return
         db.refresh(new_admin)
         print("Super Admin created: owner / DesignMaster2025")
 
-async def get_current_user(request: Request, db: Session = Depends(database.get_db)):
+# A read session: the writer has a single connection, which an admin request
+# may need for its own write while this one is still checked out
+async def get_current_user(request: Request, db: AsyncSession = Depends(database.get_read_db)):
     token = request.cookies.get("access_token")
     if not token:
         # Check Authorization header as fallback
@@ -64,32 +250,35 @@ async def get_current_user(request: Request, db: Session = Depends(database.get_
     if not token:
         return None
 
-    try:
-        # Handle "Bearer <token>" format if present in cookie
-        if token.startswith("Bearer "):
-            token = token.split(" ")[1]
-            
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
+    payload = _decode(token)
+    if payload is None or payload.get("sub") is None:
         return None
-        
-    user = db.query(models.Admin).filter(models.Admin.username == token_data.username).first()
-    if user is None:
+    token_data = schemas.TokenData(username=payload["sub"])
+    if principal_cache.is_revoked(payload):
         return None
-    return user
 
-async def get_current_active_superuser(current_user: models.Admin = Depends(get_current_user)):
+    jti = payload.get("jti")
+    if jti:
+        principal = principal_cache.get(jti)
+        if principal is not None:
+            return principal
+
+    user = (await db.execute(select(models.Admin).where(models.Admin.username == token_data.username))).scalar_one_or_none()
+    if user is None or (payload.get("uid") is not None and user.id != payload["uid"]):
+        return None
+    principal = Principal(user.id, user.username, user.role)
+    if jti:
+        principal_cache.put(jti, principal)
+    return principal
+
+async def get_current_active_superuser(current_user: Principal = Depends(get_current_user)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     if current_user.role != "super_admin":
         raise HTTPException(status_code=403, detail="Not enough privileges")
     return current_user
 
-def login_required(user: Optional[models.Admin] = Depends(get_current_user)):
+def login_required(user: Optional[Principal] = Depends(get_current_user)):
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
     return user
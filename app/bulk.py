@@ -0,0 +1,299 @@
+import csv
+import importlib.util
+import io
+import sys
+import zipfile
+from typing import Iterator, List, NamedTuple, Optional
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from . import models, schemas, search
+
+# openpyxl is only imported for the first spreadsheet (it adds ~100 ms to
+# every worker's start otherwise); CSV still works without it
+XLSX_SUPPORTED = importlib.util.find_spec("openpyxl") is not None
+
+# Bulk product import/export.
+#
+# Imports are parsed row by row (csv.DictReader, or openpyxl in read-only
+# mode for .xlsx), validated against schemas.ProductCreate and upserted on
+# Product.code in batches: one INSERT ... ON CONFLICT(code) DO UPDATE
+# executemany per batch, one transaction per batch. A bad row is reported
+# with its line number and never stops the rest of the file. Exports stream
+# rows from a server-side cursor in the same column layout, so an export
+# can be edited and imported again.
+
+COLUMNS = ("code", "name_en", "name_ar", "weight", "category", "description_en", "description_ar")
+REQUIRED = ("code", "name_en", "name_ar", "weight", "category")
+# Columns an import overwrites on an existing code; images stay as uploaded
+UPDATED_COLUMNS = ("category_id", "name_en", "name_ar", "weight", "description_en", "description_ar")
+BATCH_SIZE = 500
+FORMATS = ("csv", "xlsx")
+
+
+class BulkFormatError(ValueError):
+    pass
+
+
+class RowError(NamedTuple):
+    line: int
+    code: str
+    message: str
+
+
+class ImportReport:
+    __slots__ = ("inserted", "updated", "errors")
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors: List[RowError] = []
+
+    @property
+    def processed(self):
+        return self.inserted + self.updated + len(self.errors)
+
+
+def detect_format(filename: str) -> str:
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext not in FORMATS:
+        raise BulkFormatError("Only .csv and .xlsx files are supported")
+    if ext == "xlsx" and not XLSX_SUPPORTED:
+        raise BulkFormatError("XLSX support needs openpyxl")
+    return ext
+
+
+def _openpyxl():
+    if not XLSX_SUPPORTED:
+        raise BulkFormatError("XLSX support needs openpyxl")
+    import openpyxl
+    return openpyxl
+
+
+def _check_header(header):
+    missing = [column for column in REQUIRED if column not in header]
+    if missing:
+        raise BulkFormatError(f"Missing column(s): {', '.join(missing)}")
+
+
+def read_rows(file, fmt: str) -> Iterator[tuple]:
+    """Yield (line number, {column: value}) from a binary file object.
+
+    Raises BulkFormatError when the file cannot be parsed as `fmt`.
+    """
+    if fmt == "csv":
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(text)
+        try:
+            _check_header(reader.fieldnames or [])
+            for line, row in enumerate(reader, start=2):
+                yield line, row
+        except UnicodeDecodeError:
+            raise BulkFormatError("The file is not UTF-8 text; save it as CSV UTF-8")
+        except csv.Error as exc:
+            raise BulkFormatError(f"The file is not valid CSV: {exc}")
+        finally:
+            text.detach()  # leave the caller's file open
+    else:
+        openpyxl = _openpyxl()
+        from openpyxl.utils.exceptions import InvalidFileException
+        try:
+            workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        except (InvalidFileException, zipfile.BadZipFile):
+            raise BulkFormatError("The file is not an .xlsx workbook")
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+            _check_header(header)
+            for line, cells in enumerate(rows, start=2):
+                if any(cell is not None for cell in cells):
+                    yield line, dict(zip(header, cells))
+        finally:
+            workbook.close()
+
+
+def _clean(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # spreadsheets turn numeric codes into floats
+    value = str(value).strip()
+    return value or None
+
+
+def _category_lookup(conn) -> dict:
+    # A row may name its category by slug, id or English name
+    lookup = {}
+    for category_id, slug, name_en in conn.execute(select(models.Category.id, models.Category.slug, models.Category.name_en)):
+        lookup[str(category_id)] = category_id
+        lookup[name_en.casefold()] = category_id
+        lookup[slug.casefold()] = category_id
+    return lookup
+
+
+def _validate(row: dict, categories: dict) -> dict:
+    values = {column: _clean(row.get(column)) for column in COLUMNS}
+    missing = [column for column in REQUIRED if values[column] is None]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    category_id = categories.get(values.pop("category").casefold())
+    if category_id is None:
+        raise ValueError(f"Unknown category '{row.get('category')}'")
+    return schemas.ProductCreate(category_id=category_id, **values).model_dump(exclude={"image"})
+
+
+def _error_message(exc: Exception) -> str:
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in exc.errors())
+    return str(exc)
+
+
+def _upsert_batch(engine, batch: dict, lines: dict, report: ImportReport):
+    table = models.Product.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.code],
+        set_={column: statement.excluded[column] for column in UPDATED_COLUMNS},
+    )
+    codes = list(batch)
+    try:
+        with engine.begin() as conn:
+            existing = set(conn.execute(select(table.c.code).where(table.c.code.in_(codes))).scalars())
+            conn.execute(statement, list(batch.values()))
+            search.index_codes(conn, codes)
+    except SQLAlchemyError as exc:
+        message = str(getattr(exc, "orig", exc))
+        report.errors.extend(RowError(lines[code], code, message) for code in codes)
+        return
+    report.updated += len(existing)
+    report.inserted += len(codes) - len(existing)
+
+
+def import_file(engine, file, fmt: str, batch_size: int = BATCH_SIZE, max_rows: Optional[int] = None) -> ImportReport:
+    """Upsert every valid row of `file` by product code; raises BulkFormatError for an unreadable file.
+
+    With `max_rows`, rows past that many are skipped and reported as one error.
+    """
+    report = ImportReport()
+    with engine.connect() as conn:
+        categories = _category_lookup(conn)
+
+    batch, lines = {}, {}
+    for count, (line, row) in enumerate(read_rows(file, fmt), start=1):
+        if max_rows is not None and count > max_rows:
+            report.errors.append(RowError(line, "", f"Only {max_rows} rows are imported per file; this row and the rest were skipped"))
+            break
+        try:
+            values = _validate(row, categories)
+        except (ValueError, ValidationError) as exc:
+            report.errors.append(RowError(line, _clean(row.get("code")) or "", _error_message(exc)))
+            continue
+        # A code repeated within a batch: the later row wins, as it would across batches
+        if values["code"] in batch:
+            report.updated += 1
+        batch[values["code"]] = values
+        lines[values["code"]] = line
+        if len(batch) >= batch_size:
+            _upsert_batch(engine, batch, lines, report)
+            batch, lines = {}, {}
+    if batch:
+        _upsert_batch(engine, batch, lines, report)
+    report.errors.sort()
+    return report
+
+
+def export_rows(engine) -> Iterator[tuple]:
+    """All products in import column order, fetched from a server-side cursor."""
+    query = (
+        select(
+            models.Product.code, models.Product.name_en, models.Product.name_ar, models.Product.weight,
+            models.Category.slug, models.Product.description_en, models.Product.description_ar,
+        )
+        .join(models.Category)
+        .order_by(models.Product.id)
+    )
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=BATCH_SIZE).execute(query)
+        for row in result:
+            yield tuple(row)
+
+
+def export_csv(engine, rows_per_chunk: int = BATCH_SIZE) -> Iterator[str]:
+    """CSV export as text chunks, for a streaming response or a file."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")  # so Excel opens the Arabic columns as UTF-8
+    writer.writerow(COLUMNS)
+    pending = 0
+    for row in export_rows(engine):
+        writer.writerow(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def export_xlsx(engine, out):
+    """Write an .xlsx export to the binary file object `out`."""
+    workbook = _openpyxl().Workbook(write_only=True)
+    sheet = workbook.create_sheet("products")
+    sheet.append(COLUMNS)
+    for row in export_rows(engine):
+        sheet.append(row)
+    workbook.save(out)
+
+
+def iter_file(file, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    with file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def main(argv=None):
+    import argparse
+    from . import database
+
+    parser = argparse.ArgumentParser(prog="python -m app.bulk", description="Bulk product import/export")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importing = commands.add_parser("import", help="upsert products from a .csv or .xlsx file")
+    importing.add_argument("path")
+    importing.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    exporting = commands.add_parser("export", help="write all products to a .csv or .xlsx file ('-' for CSV on stdout)")
+    exporting.add_argument("path")
+    args = parser.parse_args(argv)
+
+    search.ensure_index(database.engine)
+    try:
+        if args.command == "import":
+            with open(args.path, "rb") as f:
+                report = import_file(database.engine, f, detect_format(args.path), args.batch_size)
+            for error in report.errors:
+                print(f"line {error.line} ({error.code or 'no code'}): {error.message}", file=sys.stderr)
+            print(f"{report.inserted} inserted, {report.updated} updated, {len(report.errors)} rejected")
+            return 1 if report.errors else 0
+
+        if args.path == "-":
+            for chunk in export_csv(database.engine):
+                sys.stdout.write(chunk)
+        elif detect_format(args.path) == "csv":
+            with open(args.path, "w", encoding="utf-8", newline="") as f:
+                for chunk in export_csv(database.engine):
+                    f.write(chunk)
+        else:
+            with open(args.path, "wb") as f:
+                export_xlsx(database.engine, f)
+        return 0
+    except BulkFormatError as exc:
+        print(exc, file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
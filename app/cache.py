@@ -0,0 +1,210 @@
+import functools
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from . import catalog, compression, i18n, settings
+
+# Full-page cache for public pages.
+#
+# Rendered bodies are kept in an LRU bounded by entry count and total bytes,
+# keyed by path (with any /ar or /en prefix), query string and language
+# (see app/i18n.py), so each language is cached on its own. Pages built
+# from the catalog remember the catalog version they were rendered from;
+# any admin write publishes a new snapshot (see catalog.refresh), which
+# drops exactly those entries. Every response carries an ETag so a browser
+# revalidating an unchanged page gets a bodiless 304. A page's gzip/brotli encodings are
+# made on the first request that asks for them and kept with the entry
+# (the byte budget counts only the uncompressed body). Streamed pages are
+# collected as they go out and cached once the stream completes.
+
+MAX_ENTRIES = settings.PAGE_CACHE_ENTRIES
+MAX_BYTES = settings.PAGE_CACHE_BYTES
+CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+
+class CachedPage:
+    __slots__ = ("body", "media_type", "etag", "catalog_version", "encoded")
+
+    def __init__(self, body: bytes, media_type: str, etag: str, catalog_version):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.catalog_version = catalog_version
+        self.encoded = {}
+
+    def encode(self, encoding: str) -> bytes:
+        body = self.encoded.get(encoding)
+        if body is None:
+            body = self.encoded[encoding] = compression.compress(self.body, encoding)
+        return body
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            # Pages that don't use the catalog never wait for it to load
+            if entry is not None and entry.catalog_version is not None and entry.catalog_version != catalog.version():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry: CachedPage):
+        # A single page may not take more than an eighth of the budget
+        if len(entry.body) > self.max_bytes // 8:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.size += len(entry.body)
+            while self._entries and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_catalog(self, *_):
+        """Drop every page rendered from the catalog."""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.catalog_version is not None]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.body)
+
+
+page_cache = ResponseCache()
+catalog.on_refresh(page_cache.invalidate_catalog)
+
+
+def cache_key(request: Request):
+    return (request.url.path, tuple(sorted(request.query_params.multi_items())), i18n.request_language(request))
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or _opaque(etag) in [_opaque(tag.strip()) for tag in header.split(",")]
+
+
+def _respond(request: Request, entry: CachedPage) -> Response:
+    encoding = None
+    if len(entry.body) >= compression.MIN_BYTES and compression.compressible(entry.media_type):
+        encoding = compression.negotiate(request.scope)
+    etag = entry.etag if encoding is None else "W/" + entry.etag
+    # LocaleMiddleware adds Cookie to Vary when the language came from the cookie
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding is None:
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+    headers["Content-Encoding"] = encoding
+    return Response(content=entry.encode(encoding), media_type=entry.media_type, headers=headers)
+
+
+def conditional_response(request: Request, body: bytes, media_type: str) -> Response:
+    """`body` with an ETag, or a 304 if the client has it already; for responses not kept in page_cache."""
+    return _respond(request, CachedPage(body, media_type, make_etag(body), None))
+
+
+async def _collect(key, response: StreamingResponse, body_iterator, version):
+    # Pass the stream through, keeping a copy to cache if it completes
+    chunks, size = [], 0
+    async for chunk in body_iterator:
+        if isinstance(chunk, str):
+            chunk = chunk.encode(response.charset)
+        if chunks is not None:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > page_cache.max_bytes // 8:
+                chunks = None  # too big to cache anyway
+        yield chunk
+    if chunks is not None:
+        body = b"".join(chunks)
+        page_cache.put(key, CachedPage(body, response.media_type, make_etag(body), version))
+
+
+def cached_page(uses_catalog: bool = False):
+    """Serve a GET route from page_cache.
+
+    The route must take `request: Request`. Set `uses_catalog` for pages
+    rendered from catalog data so admin writes invalidate them.
+    """
+    def decorator(func):
+        def lookup(request: Request):
+            key = cache_key(request)
+            # Read the version before rendering so a concurrent admin
+            # write can only make a new entry look older, never newer.
+            return key, page_cache.get(key), catalog.version() if uses_catalog else None
+
+        def store(key, response, version):
+            if response.status_code != 200 or "set-cookie" in response.headers:
+                return None
+            if isinstance(response, StreamingResponse):
+                response.body_iterator = _collect(key, response, response.body_iterator, version)
+                return None
+            entry = CachedPage(response.body, response.media_type, make_etag(response.body), version)
+            page_cache.put(key, entry)
+            return entry
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                request = kwargs["request"]
+                if uses_catalog:
+                    await catalog.ready()
+                key, entry, version = lookup(request)
+                if entry is None:
+                    response = await func(*args, **kwargs)
+                    entry = store(key, response, version)
+                    if entry is None:
+                        return response
+                return _respond(request, entry)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            request = kwargs["request"]
+            key, entry, version = lookup(request)
+            if entry is None:
+                response = func(*args, **kwargs)
+                entry = store(key, response, version)
+                if entry is None:
+                    return response
+            return _respond(request, entry)
+        return wrapper
+    return decorator
@@ -0,0 +1,214 @@
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from . import models, database
+
+# Immutable in-process snapshot of the public catalog.
+#
+# Public pages read categories and products from here instead of opening a
+# session per request. Records are plain __slots__ objects with the category
+# already attached, so templates never trigger lazy loads. Admin writes call
+# refresh(), which builds a complete new snapshot and swaps it in with a
+# single assignment; readers holding the old one are never disturbed.
+# Each snapshot remembers the catalog counter in change_versions it was
+# loaded at, so a worker told about a write (app/coordination.py) that it
+# has already picked up does not rebuild twice. A worker loads its first
+# snapshot in the background after startup (see main.py); a request that
+# needs the catalog before then waits for that load instead of starting
+# another.
+
+
+class CategoryRecord:
+    __slots__ = ("id", "name_en", "name_ar", "slug", "image", "created_at", "product_count")
+
+    def __init__(self, category: models.Category, product_count: int = 0):
+        self.id = category.id
+        self.name_en = category.name_en
+        self.name_ar = category.name_ar
+        self.slug = category.slug
+        self.image = category.image
+        self.created_at = category.created_at
+        self.product_count = product_count
+
+
+class ProductRecord:
+    __slots__ = (
+        "id", "category_id", "name_en", "name_ar", "code", "weight",
+        "description_en", "description_ar", "image", "image_width", "image_height",
+        "created_at", "category",
+    )
+
+    def __init__(self, product: models.Product, category: Optional[CategoryRecord]):
+        self.id = product.id
+        self.category_id = product.category_id
+        self.name_en = product.name_en
+        self.name_ar = product.name_ar
+        self.code = product.code
+        self.weight = product.weight
+        self.description_en = product.description_en
+        self.description_ar = product.description_ar
+        self.image = product.image
+        self.image_width = product.image_width
+        self.image_height = product.image_height
+        self.created_at = product.created_at
+        self.category = category
+
+    @property
+    def sort_key(self):
+        return (self.created_at or datetime.min, self.id)
+
+
+class _Listing:
+    """Products in ascending (created_at, id) order with their keys, for bisecting."""
+    __slots__ = ("records", "keys")
+
+    def __init__(self, records):
+        self.records = tuple(records)
+        self.keys = [record.sort_key for record in self.records]
+
+    def __len__(self):
+        return len(self.records)
+
+    def page_before(self, bound, limit: int):
+        """Up to `limit` records with key < bound (all if bound is None), newest first."""
+        end = len(self.keys) if bound is None else bisect_left(self.keys, bound)
+        start = max(0, end - limit)
+        return self.records[start:end][::-1], start > 0
+
+
+class CatalogSnapshot:
+    __slots__ = (
+        "version", "data_version", "categories", "categories_by_id", "products_by_id", "listing", "by_category",
+    )
+
+    def __init__(self, version: int, categories, products, data_version: Optional[int] = None):
+        self.version = version
+        self.data_version = data_version
+        self.categories = tuple(categories)
+        self.categories_by_id = {category.id: category for category in self.categories}
+        ordered = sorted(products, key=lambda record: record.sort_key)
+        self.products_by_id = {record.id: record for record in ordered}
+        self.listing = _Listing(ordered)
+
+        grouped = {category.id: [] for category in self.categories}
+        for record in ordered:
+            grouped.setdefault(record.category_id, []).append(record)
+        self.by_category = {category_id: _Listing(records) for category_id, records in grouped.items()}
+
+    def listing_for(self, category_id: Optional[int] = None) -> _Listing:
+        if not category_id:
+            return self.listing
+        return self.by_category.get(category_id) or _EMPTY
+
+    def facet_counts(self, ranked=None) -> dict:
+        """{category_id: product count}, over the whole catalog or just the (score, id) keys in `ranked`."""
+        if ranked is None:
+            return {category.id: category.product_count for category in self.categories}
+        counts = dict.fromkeys(self.categories_by_id, 0)
+        products = self.products_by_id
+        for _, product_id in ranked:
+            record = products.get(product_id)
+            if record is not None:
+                counts[record.category_id] = counts.get(record.category_id, 0) + 1
+        return counts
+
+
+_EMPTY = _Listing(())
+
+_lock = threading.Lock()
+_current: Optional[CatalogSnapshot] = None
+_version = 0
+_listeners = []
+
+
+def data_version(db: Session) -> int:
+    """The catalog counter in change_versions, bumped by every catalog write."""
+    return db.query(models.ChangeVersion.version).filter(models.ChangeVersion.name == "catalog").scalar() or 0
+
+
+def load(db: Session, version: int) -> CatalogSnapshot:
+    # Read first: a write landing mid-load then only costs one more refresh
+    loaded_at = data_version(db)
+    # Counts come from the trigger-maintained table, not a GROUP BY
+    counts = dict(db.query(models.CategoryCount.category_id, models.CategoryCount.product_count).all())
+    categories = [CategoryRecord(category, counts.get(category.id, 0)) for category in db.query(models.Category).all()]
+    by_id = {category.id: category for category in categories}
+    products = [
+        ProductRecord(product, by_id.get(product.category_id))
+        for product in db.query(models.Product).yield_per(1000)
+    ]
+    return CatalogSnapshot(version, categories, products, loaded_at)
+
+
+def refresh(db: Session, if_stale: bool = False) -> CatalogSnapshot:
+    """Rebuild the snapshot from the database and publish it.
+
+    With `if_stale`, keep the current snapshot when nothing in the catalog
+    was written since it was loaded.
+    """
+    global _current, _version
+    with _lock:
+        if if_stale and _current is not None and _current.data_version == data_version(db):
+            return _current
+        _version += 1
+        snapshot = load(db, _version)
+        _current = snapshot
+    for listener in _listeners:
+        listener(snapshot)
+    return snapshot
+
+
+async def reload() -> CatalogSnapshot:
+    """refresh(if_stale=True) with a session of its own, run in the threadpool.
+
+    Building a snapshot is CPU-bound, so async handlers await this instead
+    of rebuilding on the event loop. If this worker's watcher already
+    picked the write up, there is nothing left to do.
+    """
+    return await run_in_threadpool(_refresh_with_new_session, True)
+
+
+def _refresh_with_new_session(if_stale: bool = False) -> CatalogSnapshot:
+    db = database.SessionLocal()
+    try:
+        return refresh(db, if_stale)
+    finally:
+        db.close()
+
+
+def reload_if_stale():
+    """Catch up with catalog writes made by other workers (see app/coordination.py)."""
+    _refresh_with_new_session(if_stale=True)
+
+
+def on_refresh(listener):
+    """Register `listener(snapshot)` to run after every new snapshot is published."""
+    _listeners.append(listener)
+    return listener
+
+
+def version() -> int:
+    return current().version
+
+
+async def ready():
+    """Wait for the first snapshot without blocking the event loop.
+
+    Async handlers await this (directly or as a dependency) before calling
+    current(): while the startup load runs in the background, current()
+    blocks on _lock, and on the loop that would stall every other request.
+    Once loaded, this returns straight away.
+    """
+    if _current is None:
+        await run_in_threadpool(current)
+
+
+def current() -> CatalogSnapshot:
+    snapshot = _current
+    if snapshot is None:
+        # If the startup load is running, this waits for its snapshot
+        snapshot = _refresh_with_new_session(if_stale=True)
+    return snapshot
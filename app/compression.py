@@ -0,0 +1,175 @@
+import zlib
+from typing import Optional
+from starlette.datastructures import MutableHeaders
+from . import settings
+
+try:
+    import brotli
+except ImportError:  # gzip only without it
+    brotli = None
+
+# Negotiated compression for dynamic responses.
+#
+# CompressionMiddleware brotli- or gzip-encodes HTML, JSON, CSV and other
+# text responses as they leave the app, whichever the client prefers and we
+# support. Bodies under VINES_COMPRESS_MIN_BYTES are sent as they are.
+# Streamed bodies (StreamingTemplateResponse, the CSV export) are compressed
+# chunk by chunk and flushed after each one, so the client can start on the
+# first bytes before the rest is rendered. Responses that already carry a
+# Content-Encoding (the precompressed static assets, cached pages) pass
+# through untouched.
+
+MIN_BYTES = settings.COMPRESS_MIN_BYTES
+GZIP_LEVEL = settings.GZIP_LEVEL
+BROTLI_QUALITY = settings.BROTLI_QUALITY
+
+COMPRESSIBLE_TYPES = (
+    "text/html", "text/plain", "text/css", "text/csv", "text/xml", "text/javascript",
+    "application/json", "application/javascript", "application/xml", "image/svg+xml",
+)
+
+
+def accepted_encodings(scope) -> set:
+    for key, value in scope.get("headers", []):
+        if key == b"accept-encoding":
+            accepted = set()
+            for part in value.decode("latin-1").split(","):
+                token, _, params = part.strip().partition(";")
+                if params.replace(" ", "") not in ("q=0", "q=0.0"):
+                    accepted.add(token.strip().lower())
+            return accepted
+    return set()
+
+
+def negotiate(scope) -> Optional[str]:
+    """The encoding to use for this request's response, or None for identity."""
+    accepted = accepted_encodings(scope)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def compressible(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.split(";", 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY, mode=brotli.MODE_TEXT)
+    compressor = _gzip_compressor()
+    return compressor.compress(body) + compressor.flush()
+
+
+def _gzip_compressor():
+    # wbits 31: a gzip container rather than a bare zlib stream
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+class _Stream:
+    """Incremental compressor that flushes after every chunk."""
+
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY, mode=brotli.MODE_TEXT)
+        else:
+            self._compressor = _gzip_compressor()
+        self.encoding = encoding
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = vary + ", Accept-Encoding"
+
+
+def weaken_etag(headers: MutableHeaders):
+    # The compressed bytes are not the representation a strong ETag names
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = "W/" + etag
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(scope)
+        start = None
+        stream = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, stream, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Held until the first body chunk decides
+                start = {**message, "headers": list(message.get("headers", []))}
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is not None:
+                data = stream.chunk(body)
+                if not more_body:
+                    data += stream.finish()
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            eligible = (
+                start["status"] >= 200 and start["status"] not in (204, 304)
+                and "content-encoding" not in headers
+                and compressible(headers.get("content-type"))
+            )
+            if eligible:
+                add_vary(headers)
+            length = headers.get("content-length")
+            small = len(body) < self.minimum_size if not more_body else (
+                length is not None and length.isdigit() and int(length) < self.minimum_size
+            )
+            if not eligible or encoding is None or small:
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            headers["Content-Encoding"] = encoding
+            weaken_etag(headers)
+            if not more_body:
+                data = compress(body, encoding)
+                headers["Content-Length"] = str(len(data))
+                await send(start)
+                await send({"type": "http.response.body", "body": data})
+                return
+
+            del headers["Content-Length"]
+            stream = _Stream(encoding)
+            await send(start)
+            await send({"type": "http.response.body", "body": stream.chunk(body), "more_body": True})
+
+        await self.app(scope, receive, send_compressed)
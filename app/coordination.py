@@ -0,0 +1,135 @@
+import contextlib
+import logging
+import os
+import threading
+import time
+from typing import Optional
+from . import settings
+
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): run a single worker there
+    fcntl = None
+
+# Running several workers (uvicorn --workers N, gunicorn) on one database.
+#
+# Startup work that must happen once (checking migrations, building the
+# search index, creating the first admin) runs under an exclusive file lock
+# in VINES_LOCK_DIR, so workers booting together take turns instead of
+# racing each other. After that each worker keeps its own catalog snapshot,
+# page cache and principal cache. Writes bump a counter in change_versions
+# (triggers from migration v0006, so seed scripts and other workers count
+# too), and every worker polls SQLite's PRAGMA data_version on a connection
+# of its own every VINES_INVALIDATION_POLL_MS. The pragma is a cheap header
+# read that only changes when another connection commits, so the counters
+# are only read after a write; handlers registered for a changed counter
+# then drop and rebuild what was derived from it. No broker is involved.
+
+LOCK_DIR = settings.LOCK_DIR
+POLL_SECONDS = settings.INVALIDATION_POLL_MS / 1000
+
+_handlers = {}
+
+logger = logging.getLogger("vines.coordination")
+
+
+@contextlib.contextmanager
+def exclusive(name: str = "bootstrap"):
+    """Hold LOCK_DIR/<name>.lock for the duration; other processes wait for it."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(os.path.join(LOCK_DIR, f"{name}.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def on_change(name: str, handler):
+    """Call `handler()` from the watcher thread when counter `name` moves.
+
+    Handlers for one counter run in the order they were registered.
+    """
+    _handlers.setdefault(name, []).append(handler)
+    return handler
+
+
+def read_versions(conn) -> dict:
+    return dict(conn.execute("SELECT name, version FROM change_versions").fetchall())
+
+
+class ChangeWatcher:
+    def __init__(self, engine, interval: float = POLL_SECONDS):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._raw = engine.raw_connection()
+        conn = self._raw.driver_connection
+        # What this worker has already derived its state from
+        self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        self._versions = read_versions(conn)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="vines-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._raw.close()
+
+    def poll(self) -> list:
+        """Run the handlers of every counter that moved since the last poll; returns their names."""
+        conn = self._raw.driver_connection
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return []
+        versions = read_versions(conn)
+        self._data_version = data_version
+        changed = [name for name, version in versions.items() if self._versions.get(name) != version]
+        previous, self._versions = self._versions, versions
+        for name in changed:
+            for handler in _handlers.get(name, ()):
+                try:
+                    handler()
+                except Exception:
+                    logger.exception("invalidation handler for %r failed", name)
+                    # Still stale: keep the old version so the next poll runs
+                    # this counter's handlers again, without waiting for a write
+                    if name in previous:
+                        self._versions[name] = previous[name]
+                    else:
+                        del self._versions[name]
+                    self._data_version = None
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("invalidation poll failed")
+                time.sleep(1)
+
+
+_watcher: Optional[ChangeWatcher] = None
+
+
+def start(engine):
+    """Start this worker's watcher; writes committed after this call reach its handlers."""
+    global _watcher
+    if _watcher is None:
+        _watcher = ChangeWatcher(engine)
+        _watcher.start()
+
+
+def stop():
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
@@ -1,19 +1,81 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from . import metrics, settings
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./vines.db"
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+# Same database through the aiosqlite driver for the request handlers
+ASYNC_DATABASE_URL = make_url(SQLALCHEMY_DATABASE_URL).set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
 
+# Engine profile. WAL lets the public site keep reading while an admin
+# writes; NORMAL sync is durable across app crashes (only an OS crash can
+# lose the last commits); mmap and a bigger page cache keep hot pages out
+# of read() calls; the busy timeout makes a second writer wait instead of
+# failing with "database is locked". Foreign keys are on so ON DELETE
+# CASCADE is enforced.
+SQLITE_PRAGMAS = (
+    ("journal_mode", settings.SQLITE_JOURNAL_MODE),
+    ("synchronous", settings.SQLITE_SYNCHRONOUS),
+    ("mmap_size", settings.SQLITE_MMAP_SIZE),
+    ("cache_size", settings.SQLITE_CACHE_SIZE),
+    ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+    ("temp_store", "MEMORY"),
+    ("foreign_keys", "ON"),
+)
+
+
+def apply_profile(engine, read_only: bool = False):
+    """Run the SQLite pragmas on every connection `engine` opens."""
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS:
+            if read_only and name == "journal_mode":
+                continue  # persistent, set by the writers
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+
+# Sync engine: startup, scripts (seed.py) and work run in the threadpool
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False},
+    poolclass=metrics.timed_pool(QueuePool, "sync"),
 )
+apply_profile(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async writer: one connection, so admin mutations are serialized in
+# process instead of contending for SQLite's write lock
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, pool_size=1, max_overflow=0, pool_timeout=settings.DB_POOL_TIMEOUT,
+    poolclass=metrics.timed_pool(AsyncAdaptedQueuePool, "write"),
+)
+apply_profile(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Async readers: public pages and the API, never blocked by the writer under WAL
+read_engine = create_async_engine(
+    ASYNC_DATABASE_URL, pool_size=settings.DB_READ_POOL_SIZE, max_overflow=0, pool_timeout=settings.DB_POOL_TIMEOUT,
+    poolclass=metrics.timed_pool(AsyncAdaptedQueuePool, "read"),
+)
+apply_profile(read_engine.sync_engine, read_only=True)
+ReadSessionLocal = async_sessionmaker(read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def get_read_db():
+    async with ReadSessionLocal() as db:
+        yield db
+
+async def dispose():
+    await async_engine.dispose()
+    await read_engine.dispose()
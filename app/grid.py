@@ -0,0 +1,95 @@
+from typing import Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from . import catalog, images, models, search
+
+# Server-side admin product grid.
+#
+# The dashboard asks for one page at a time. Every sort order is backed by
+# an index (see migrations v0003/v0004), so the page of ids comes from an
+# index scan and only those rows are then loaded, with their categories in
+# one extra query. Without a text filter the total comes from the catalog
+# snapshot instead of a COUNT over the table.
+
+PER_PAGE = 25
+MAX_PER_PAGE = 100
+THUMBNAIL_WIDTH = 160
+
+SORTS = {
+    "created_at": (models.Product.created_at, models.Product.id),
+    "code": (models.Product.code,),
+    "name_en": (models.Product.name_en, models.Product.id),
+    "id": (models.Product.id,),
+}
+ORDERS = ("asc", "desc")
+
+
+def _thumbnail(product: models.Product) -> Optional[str]:
+    if not product.image or product.image == "placeholder.jpg":
+        return None
+    if product.image_width and THUMBNAIL_WIDTH in images.variant_widths(product.image_width):
+        return images.variant_url(product.image, THUMBNAIL_WIDTH, "webp")
+    return product.image
+
+
+def _row(product: models.Product) -> dict:
+    return {
+        "id": product.id,
+        "code": product.code,
+        "name_en": product.name_en,
+        "name_ar": product.name_ar,
+        "weight": product.weight,
+        "category_id": product.category_id,
+        "category_name": product.category.name_en if product.category else None,
+        "description_en": product.description_en,
+        "description_ar": product.description_ar,
+        "image": product.image,
+        "thumbnail": _thumbnail(product),
+        "created_at": product.created_at,
+    }
+
+
+async def product_grid(db: AsyncSession, page: int = 1, per_page: int = PER_PAGE, sort: str = "created_at",
+                       order: str = "desc", category_id: Optional[int] = None, q: Optional[str] = None) -> dict:
+    """One page of the admin grid; raises ValueError for an unknown sort or order."""
+    if sort not in SORTS or order not in ORDERS:
+        raise ValueError("Unknown sort order")
+    q = (q or "").strip()
+
+    conditions = []
+    if category_id:
+        conditions.append(models.Product.category_id == category_id)
+    if q:
+        conditions.append(search.product_filter(q))
+
+    if q:
+        total = (await db.execute(select(func.count()).select_from(models.Product).where(*conditions))).scalar_one()
+    else:
+        total = len(catalog.current().listing_for(category_id))
+
+    pages = max(1, -(-total // per_page))
+    page = min(max(page, 1), pages)
+    columns = SORTS[sort]
+    ordering = [column.desc() if order == "desc" else column.asc() for column in columns]
+
+    ids = (await db.execute(
+        select(models.Product.id).where(*conditions).order_by(*ordering)
+        .limit(per_page).offset((page - 1) * per_page)
+    )).scalars().all()
+    products = {}
+    if ids:
+        loaded = await db.execute(
+            select(models.Product).options(selectinload(models.Product.category)).where(models.Product.id.in_(ids))
+        )
+        products = {product.id: product for product in loaded.scalars()}
+
+    return {
+        "items": [_row(products[product_id]) for product_id in ids if product_id in products],
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": pages,
+        "sort": sort,
+        "order": order,
+    }
@@ -0,0 +1,117 @@
+from urllib.parse import urlencode
+from starlette.datastructures import MutableHeaders
+from . import settings
+
+# Which language a public page is rendered in.
+#
+# Each page is rendered in one language only. /ar/products and
+# /en/products name the language in the URL; a bare /products uses the
+# visitor's vines_lang cookie (set by the language switch in base.html),
+# falling back to VINES_DEFAULT_LANGUAGE. LocaleMiddleware moves the prefix
+# into root_path, so routes match as if it were not there while
+# request.url (and every cache key built from it) keeps it. Pages whose
+# language came from the cookie say so with `Vary: Cookie`; prefixed ones
+# only depend on their URL. Templates get `lang`, `text_dir`, `lang_url()`
+# for links that stay in the current language, and `language_urls` for the
+# switch and (when `localized`) hreflang alternates.
+
+LANGUAGES = ("en", "ar")
+RTL = {"ar"}
+DEFAULT = settings.DEFAULT_LANGUAGE if settings.DEFAULT_LANGUAGE in LANGUAGES else LANGUAGES[0]
+COOKIE = "vines_lang"
+# Pages served under a language prefix; everything else (admin, API, static) is not
+LOCALIZED_PATHS = {"/", "/products", "/about", "/contact"}
+
+
+def _cookie_language(scope) -> str:
+    for name, value in scope.get("headers", ()):
+        if name == b"cookie":
+            for part in value.decode("latin-1").split(";"):
+                key, _, lang = part.strip().partition("=")
+                if key == COOKIE and lang in LANGUAGES:
+                    return lang
+    return DEFAULT
+
+
+def request_language(request) -> str:
+    return request.scope.get("vines.lang") or _cookie_language(request.scope)
+
+
+def _prefix(request) -> str:
+    # "/ar" when the page was asked for under a language prefix
+    return request.scope.get("vines.lang_prefix", "")
+
+
+def localized_url(request, path: str) -> str:
+    """`path` in the language of the current page (prefixed only if the page was)."""
+    prefix = _prefix(request)
+    if not prefix:
+        return path
+    return prefix if path == "/" else prefix + path
+
+
+def language_urls(request) -> dict:
+    """This page (with its query string) under each language's prefix."""
+    query = "?" + urlencode(request.query_params.multi_items()) if request.query_params else ""
+    if "vines.lang" not in request.scope:
+        # Not a localized page (the admin): the cookie alone switches it
+        return {lang: request.url.path + query for lang in LANGUAGES}
+    path = request.url.path[len(_prefix(request)):] or "/"
+    return {lang: (f"/{lang}" if path == "/" else f"/{lang}{path}") + query for lang in LANGUAGES}
+
+
+def template_context(request) -> dict:
+    lang = request_language(request)
+    return {
+        "lang": lang,
+        "text_dir": "rtl" if lang in RTL else "ltr",
+        "lang_url": lambda path: localized_url(request, path),
+        "language_urls": language_urls(request),
+        "localized": "vines.lang" in request.scope,
+    }
+
+
+class LocaleMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        route_path = path[len(root_path):] if path.startswith(root_path) else path
+        head, _, rest = route_path[1:].partition("/")
+        localized = False
+        if head in LANGUAGES and "/" + rest in LOCALIZED_PATHS:
+            prefix = "/" + head
+            if not rest and not route_path.endswith("/"):
+                path += "/"  # "/ar" is the home page, which routes as "/"
+            scope = {**scope, "path": path, "root_path": root_path + prefix,
+                     "vines.lang": head, "vines.lang_prefix": root_path + prefix}
+            localized = True
+        elif route_path in LOCALIZED_PATHS:
+            scope = {**scope, "vines.lang": _cookie_language(scope)}
+            localized = True
+        if not localized:
+            await self.app(scope, receive, send)
+            return
+
+        from_cookie = "vines.lang_prefix" not in scope
+
+        async def send_with_language(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=list(message.get("headers", [])))
+                headers["Content-Language"] = scope["vines.lang"]
+                if from_cookie:
+                    vary = headers.get("vary")
+                    if not vary:
+                        headers["Vary"] = "Cookie"
+                    elif "cookie" not in vary.lower():
+                        headers["Vary"] = "Cookie, " + vary
+                message = {**message, "headers": headers.raw}
+            await send(message)
+
+        await self.app(scope, receive, send_with_language)
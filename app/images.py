@@ -0,0 +1,127 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import NamedTuple, Optional
+from . import settings
+
+# Responsive variants for uploaded product images.
+#
+# Every upload is resized to the standard widths below (never upscaled) in
+# WebP plus a fallback format: PNG for uploads that are PNGs (product
+# cut-outs need their transparency), JPEG otherwise. Variants sit next to
+# the original as `<stem>-<width>.<ext>`, so the URLs can be derived from
+# Product.image and Product.image_width alone.
+#
+# Pillow is CPU-bound and holds the GIL, so resizing runs in a process pool.
+
+WIDTHS = (160, 320, 640, 1280)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+STATIC_ROOT = "app/static"
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+
+
+def _fallback_ext(image_url: str) -> str:
+    return "png" if image_url.lower().endswith(".png") else "jpg"
+
+
+def variant_widths(width: Optional[int]):
+    """Widths generated for an original `width` pixels wide."""
+    if not width:
+        return ()
+    widths = [w for w in WIDTHS if w < width]
+    if width <= WIDTHS[-1]:
+        widths.append(width)
+    return tuple(widths)
+
+
+def variant_url(image_url: str, width: int, ext: str) -> str:
+    stem, _ = os.path.splitext(image_url)
+    return f"{stem}-{width}.{ext}"
+
+
+def url_to_path(image_url: str) -> str:
+    return os.path.join(STATIC_ROOT, image_url[len("/static/"):])
+
+
+def _render_variants(path: str) -> Optional[ImageInfo]:
+    # Runs in a worker process
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        original = Image.open(path)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        # Not an image, or too large to decode safely
+        return None
+    with original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    width, height = image.size
+    stem, _ = os.path.splitext(path)
+    fallback = _fallback_ext(path)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+
+    for target in variant_widths(width):
+        resized = image if target == width else image.resize(
+            (target, max(1, round(height * target / width))), Image.LANCZOS
+        )
+        resized = resized.convert("RGBA" if has_alpha else "RGB")
+        resized.save(f"{stem}-{target}.webp", "WEBP", quality=WEBP_QUALITY, method=4)
+        if fallback == "png":
+            resized.save(f"{stem}-{target}.png", "PNG", optimize=True)
+        else:
+            resized.convert("RGB").save(f"{stem}-{target}.jpg", "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return ImageInfo(width, height)
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _pool
+
+
+async def process(image_url: str) -> Optional[ImageInfo]:
+    """Generate the variants for an uploaded image; None if it could not be decoded.
+
+    Any other failure (a missing file, a full disk, a broken pool) raises,
+    so the process_image job is retried.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _executor()
+    try:
+        return await loop.run_in_executor(pool, _render_variants, url_to_path(image_url))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed on a huge image) and the pool refuses
+        # all work from now on; drop it so the job's retry gets a fresh one.
+        # Another job may have replaced it already.
+        if _pool is pool:
+            shutdown()
+        raise
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def srcset(image_url: Optional[str], width: Optional[int], ext: str = "webp") -> str:
+    if not image_url or not width:
+        return ""
+    if ext == "fallback":
+        ext = _fallback_ext(image_url)
+    return ", ".join(f"{variant_url(image_url, w, ext)} {w}w" for w in variant_widths(width))
+
+
+def register_template_helpers(templates):
+    templates.env.globals["srcset"] = srcset
+    templates.env.globals["variant_widths"] = variant_widths
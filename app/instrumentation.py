@@ -0,0 +1,208 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from jinja2 import Template
+from sqlalchemy import event
+from . import metrics, settings
+
+# Per-request performance accounting.
+#
+# TimingMiddleware opens a RequestStats for every HTTP request; SQLAlchemy
+# cursor events and the Jinja template class add to whichever one is active
+# in the current context (sync handlers run in the threadpool with a copy of
+# the request's context, so they see the same object). The totals go out in a
+# Server-Timing header and slow or N+1-looking requests are logged. A
+# streamed template is rendered after its headers are sent, so its header
+# only covers the time until then, and the full totals are logged (at INFO)
+# when the stream ends. Every request is also counted in the /metrics
+# histograms, by route template.
+
+logger = logging.getLogger("vines.perf")
+
+SLOW_REQUEST_MS = settings.SLOW_REQUEST_MS
+REPEATED_QUERY_THRESHOLD = settings.REPEATED_QUERY_THRESHOLD
+
+
+class RequestStats:
+    __slots__ = ("statements", "sql_seconds", "render_seconds", "started", "streaming", "_statements")
+
+    def __init__(self):
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.started = time.perf_counter()
+        self.streaming = False  # a template is rendered while the body is sent
+        self._statements = Counter()
+
+    def record_query(self, statement: str, seconds: float):
+        self.statements += 1
+        self.sql_seconds += seconds
+        self._statements[statement] += 1
+
+    def repeated_queries(self):
+        return [
+            (statement, count)
+            for statement, count in self._statements.most_common()
+            if count >= REPEATED_QUERY_THRESHOLD
+        ]
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("vines_request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# --- SQLAlchemy ---
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("vines_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["vines_query_start"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.record_query(statement, time.perf_counter() - started)
+
+
+# --- Jinja ---
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            stats.render_seconds += time.perf_counter() - started
+
+    def generate(self, *args, **kwargs):
+        # Looked up now: the pieces are pulled later, from the threadpool
+        stats = _current.get()
+        pieces = super().generate(*args, **kwargs)
+        if stats is None:
+            return pieces
+        stats.streaming = True
+        return _timed_pieces(pieces, stats)
+
+
+def _timed_pieces(pieces, stats: RequestStats):
+    while True:
+        started = time.perf_counter()
+        try:
+            piece = next(pieces)
+        except StopIteration:
+            return
+        finally:
+            stats.render_seconds += time.perf_counter() - started
+        yield piece
+
+
+def instrument_templates(templates):
+    """Time every render of a Jinja2Templates instance (call before its first render)."""
+    templates.env.template_class = TimedTemplate
+
+
+# --- ASGI ---
+class TimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500  # unless a response starts
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                timing = server_timing(stats, before_body=stats.streaming)
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        metrics.IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.IN_FLIGHT.dec()
+            _current.reset(token)
+            _record_request(scope, status, time.perf_counter() - stats.started)
+            _log_request(scope, stats)
+            if stats.streaming:
+                logger.info("%s %s streamed: %s", scope.get("method", ""), _request_path(scope), server_timing(stats))
+
+
+def _route_label(scope) -> str:
+    # The route template (/admin/products/edit/{product_id}), never the raw
+    # path, so ids and typos can't blow up the number of series
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("path", "").startswith("/static/"):
+        return "/static"
+    return "unmatched"
+
+
+def _record_request(scope, status: int, seconds: float):
+    method = scope.get("method", "")
+    route = _route_label(scope)
+    metrics.REQUESTS.inc(method=method, route=route, status=status)
+    metrics.REQUEST_SECONDS.observe(seconds, method=method, route=route)
+
+
+def server_timing(stats: RequestStats, before_body: bool = False) -> str:
+    """The Server-Timing value for the request so far.
+
+    `before_body` is for a streamed template whose rendering (and any
+    queries it makes) is still to come. Render and total are then left out
+    rather than reported as 0, and first-byte is the time until the headers.
+    """
+    elapsed = time.perf_counter() - stats.started
+    handler = max(elapsed - stats.sql_seconds - stats.render_seconds, 0.0)
+    if before_body:
+        return ", ".join([
+            f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.statements} queries before the body"',
+            f"handler;dur={handler * 1000:.2f}",
+            f"first-byte;dur={elapsed * 1000:.2f}",
+        ])
+    return ", ".join([
+        f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.statements} queries"',
+        f"render;dur={stats.render_seconds * 1000:.2f}",
+        f"handler;dur={handler * 1000:.2f}",
+        f"total;dur={elapsed * 1000:.2f}",
+    ])
+
+
+def _request_path(scope) -> str:
+    path = scope.get("path", "")
+    if scope.get("query_string"):
+        path = f"{path}?{scope['query_string'].decode('latin-1')}"
+    return path
+
+
+def _log_request(scope, stats: RequestStats):
+    elapsed_ms = (time.perf_counter() - stats.started) * 1000
+    repeated = stats.repeated_queries()
+    if elapsed_ms < SLOW_REQUEST_MS and not repeated:
+        return
+
+    logger.warning(
+        "%s %s took %.1f ms (%d queries, %.1f ms SQL, %.1f ms render)",
+        scope.get("method", ""), _request_path(scope), elapsed_ms,
+        stats.statements, stats.sql_seconds * 1000, stats.render_seconds * 1000,
+    )
+    for statement, count in repeated:
+        logger.warning("  possible N+1: %dx %s", count, " ".join(statement.split()))
@@ -0,0 +1,301 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+from sqlalchemy import and_, delete, event, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import database, metrics, models, settings
+
+# Durable background jobs, queued in SQLite and run by asyncio workers.
+#
+# Admin requests add a row to `jobs` in the same transaction as the write
+# that needs the work (add()), so the job exists exactly when the write
+# does, and return right after the commit. Each app process runs up to
+# VINES_JOB_WORKERS jobs at once. A commit that queued a job wakes this
+# process's dispatcher straight away; jobs queued elsewhere, retries and
+# scheduled jobs are found by polling every VINES_JOB_POLL_SECONDS (a read,
+# so idle polling never takes the write lock). A job is claimed with a
+# conditional UPDATE, so with several workers each job runs once. A failed
+# job is retried after VINES_JOB_BACKOFF_SECONDS, doubling each time, until
+# its max_attempts are used up; a job whose process died is picked up
+# again once its lease (VINES_JOB_LEASE_SECONDS) has run out.
+#
+# Handlers are `async def handler(payload: dict)` registered with
+# @jobs.handler(kind); what they return is stored as the job's result.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+logger = logging.getLogger("vines.jobs")
+
+WORKERS = settings.JOB_WORKERS
+POLL_SECONDS = settings.JOB_POLL_SECONDS
+MAX_ATTEMPTS = settings.JOB_MAX_ATTEMPTS
+BACKOFF_SECONDS = settings.JOB_BACKOFF_SECONDS
+MAX_BACKOFF_SECONDS = 3600.0
+LEASE_SECONDS = settings.JOB_LEASE_SECONDS
+KEEP_SECONDS = settings.JOB_KEEP_SECONDS
+# last_error keeps the end of the traceback, where the exception is
+MAX_ERROR_CHARS = 8000
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _Handler(NamedTuple):
+    func: object
+    max_attempts: int
+
+
+_handlers = {}
+_periodic = {}  # kind -> seconds between runs
+
+
+def handler(kind: str, max_attempts: int = MAX_ATTEMPTS):
+    """Register `func(payload)` to run jobs of `kind`."""
+    def decorator(func):
+        _handlers[kind] = _Handler(func, max_attempts)
+        return func
+    return decorator
+
+
+def every(kind: str, seconds: float):
+    """Run the `kind` job (with an empty payload) every `seconds`, in one process at a time."""
+    _periodic[kind] = seconds
+
+
+# --- Queueing ---
+def insert(kind: str, payload: Optional[dict] = None, delay: float = 0.0, unique: bool = False):
+    """INSERT statement for a new job; with `unique`, nothing is added while one of `kind` is queued."""
+    if kind not in _handlers:
+        raise LookupError(f"no job handler for {kind!r}")
+    now = time.time()
+    stmt = sqlite_insert(models.Job).values(
+        kind=kind, payload=json.dumps(payload or {}), status=QUEUED, attempts=0,
+        max_attempts=_handlers[kind].max_attempts, run_after=now + delay,
+        unique_key=kind if unique else None, created_at=now,
+    )
+    if unique:
+        stmt = stmt.on_conflict_do_nothing(index_elements=["unique_key"], index_where=models.Job.status == QUEUED)
+    return stmt.returning(models.Job.id)
+
+
+async def add(db: AsyncSession, kind: str, payload: Optional[dict] = None, **options) -> Optional[int]:
+    """Queue a job in `db`'s transaction; it only exists once the caller commits.
+
+    Returns the job's id, or None when a unique job was already queued.
+    """
+    job_id = (await db.execute(insert(kind, payload, **options))).scalar()
+    db.sync_session.info["wake_jobs"] = True
+    return job_id
+
+
+async def enqueue(kind: str, payload: Optional[dict] = None, **options) -> Optional[int]:
+    """Queue a job in a transaction of its own."""
+    async with database.AsyncSessionLocal() as db:
+        job_id = await add(db, kind, payload, **options)
+        await db.commit()
+    return job_id
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop("wake_jobs", False):
+        wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("wake_jobs", None)
+
+
+# --- Status ---
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, timezone.utc) if value is not None else None
+
+
+def describe(job: models.Job) -> dict:
+    return {
+        "id": job.id, "kind": job.kind, "status": job.status,
+        "attempts": job.attempts, "max_attempts": job.max_attempts,
+        "run_after": _timestamp(job.run_after), "created_at": _timestamp(job.created_at),
+        "finished_at": _timestamp(job.finished_at),
+        "last_error": job.last_error, "result": job.result,
+    }
+
+
+# --- Running ---
+class _Claimed(NamedTuple):
+    id: int
+    kind: str
+    payload: str
+    attempts: int
+    max_attempts: int
+
+
+def _due(now: float):
+    return or_(
+        and_(models.Job.status == QUEUED, models.Job.run_after <= now),
+        and_(models.Job.status == RUNNING, models.Job.locked_at < now - LEASE_SECONDS),
+    )
+
+
+async def _claim(limit: int) -> list:
+    now = time.time()
+    async with database.ReadSessionLocal() as db:
+        ids = (await db.execute(
+            select(models.Job.id).where(_due(now)).order_by(models.Job.run_after, models.Job.id).limit(limit)
+        )).scalars().all()
+    if not ids:
+        return []
+    claimed = []
+    async with database.AsyncSessionLocal() as db:
+        for job_id in ids:
+            # Only one process's UPDATE still finds the job due
+            row = (await db.execute(
+                update(models.Job).where(models.Job.id == job_id, _due(now))
+                .values(status=RUNNING, locked_by=WORKER_ID, locked_at=now, attempts=models.Job.attempts + 1)
+                .returning(models.Job.id, models.Job.kind, models.Job.payload, models.Job.attempts, models.Job.max_attempts)
+            )).first()
+            if row is not None:
+                claimed.append(_Claimed(*row))
+        await db.commit()
+    return claimed
+
+
+def backoff(attempts: int) -> float:
+    return min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+
+
+async def _finish(job: _Claimed, result=None, error: Optional[str] = None):
+    now = time.time()
+    if error is None:
+        values = {"status": DONE, "finished_at": now, "last_error": None,
+                  "result": None if result is None else str(result)}
+    elif job.attempts < job.max_attempts:
+        values = {"status": QUEUED, "run_after": now + backoff(job.attempts), "last_error": error}
+    else:
+        values = {"status": FAILED, "finished_at": now, "last_error": error}
+    async with database.AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.Job).where(models.Job.id == job.id, models.Job.locked_by == WORKER_ID)
+            .values(locked_by=None, locked_at=None, **values)
+        )
+        if values["status"] != QUEUED and job.kind in _periodic:
+            await db.execute(insert(job.kind, delay=_periodic[job.kind], unique=True))
+        await db.commit()
+
+
+async def _run(job: _Claimed):
+    started = time.perf_counter()
+    registered = _handlers.get(job.kind)
+    try:
+        if registered is None:
+            raise LookupError(f"no job handler for {job.kind!r}")
+        result = await registered.func(json.loads(job.payload))
+    except Exception as exc:
+        outcome = "retry" if job.attempts < job.max_attempts else "failed"
+        logger.exception("job %s (%s) attempt %s/%s failed", job.id, job.kind, job.attempts, job.max_attempts)
+        await _finish(job, error="".join(traceback.format_exception(exc)).strip()[-MAX_ERROR_CHARS:])
+    else:
+        outcome = "done"
+        await _finish(job, result=result)
+    metrics.JOBS.inc(kind=job.kind, outcome=outcome)
+    metrics.JOB_SECONDS.observe(time.perf_counter() - started, kind=job.kind)
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+_dispatcher: Optional[asyncio.Task] = None
+_running = set()
+
+
+def wake():
+    """Look for due jobs now instead of at the next poll; safe from any thread."""
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+async def _dispatch():
+    while True:
+        _wakeup.clear()
+        free = WORKERS - len(_running)
+        claimed = []
+        if free > 0:
+            try:
+                claimed = await _claim(free)
+            except Exception:
+                logger.exception("job claim failed")
+            for job in claimed:
+                task = asyncio.create_task(_run(job))
+                _running.add(task)
+                task.add_done_callback(_running.discard)
+                task.add_done_callback(lambda _: wake())  # a free slot: look again
+            if len(claimed) == free:
+                continue  # there may be more due
+        try:
+            await asyncio.wait_for(_wakeup.wait(), POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def start():
+    """Schedule the periodic jobs and start this process's dispatcher."""
+    global _loop, _wakeup, _dispatcher
+    if _dispatcher is not None:
+        return
+    async with database.AsyncSessionLocal() as db:
+        for kind, seconds in _periodic.items():
+            await db.execute(insert(kind, delay=seconds, unique=True))
+        await db.commit()
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    _dispatcher = asyncio.create_task(_dispatch())
+
+
+async def stop(grace: float = 5.0):
+    """Stop taking jobs and give running ones `grace` seconds to finish.
+
+    Jobs cut short are queued again without using up an attempt.
+    """
+    global _loop, _wakeup, _dispatcher
+    if _dispatcher is None:
+        return
+    _dispatcher.cancel()
+    await asyncio.gather(_dispatcher, return_exceptions=True)
+    if _running:
+        _, unfinished = await asyncio.wait(set(_running), timeout=grace)
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+    _running.clear()
+    _loop = _wakeup = _dispatcher = None
+    try:
+        async with database.AsyncSessionLocal() as db:
+            await db.execute(
+                update(models.Job).where(models.Job.status == RUNNING, models.Job.locked_by == WORKER_ID)
+                .values(status=QUEUED, attempts=models.Job.attempts - 1, locked_by=None, locked_at=None)
+            )
+            await db.commit()
+    except Exception:
+        # Their lease runs out and another worker picks them up
+        logger.exception("could not requeue running jobs")
+
+
+# --- Housekeeping ---
+@handler("prune_jobs")
+async def prune(payload: dict):
+    """Forget finished jobs older than KEEP_SECONDS."""
+    async with database.AsyncSessionLocal() as db:
+        result = await db.execute(
+            delete(models.Job).where(models.Job.status.in_((DONE, FAILED)), models.Job.finished_at < time.time() - KEEP_SECONDS)
+        )
+        await db.commit()
+    return f"{result.rowcount} removed"
+
+every("prune_jobs", 24 * 3600)
@@ -0,0 +1,360 @@
+import json
+import math
+import os
+import threading
+import time
+from typing import Optional
+from . import coordination, settings
+
+# Operational metrics in the Prometheus text format.
+#
+# Counters, gauges and histograms live in plain dicts in each process. With
+# several uvicorn workers a scrape reaches only one of them, so every worker
+# writes its values to VINES_METRICS_DIR/<pid>.json once per
+# VINES_METRICS_FLUSH_SECONDS (and at shutdown), and /metrics sums the files
+# of all workers. Counters and histograms of workers that have exited are
+# kept, so totals never go backwards; gauges only count live workers. When
+# a worker starts, the files of dead workers (and an old file under its own,
+# recycled pid) are folded into VINES_METRICS_DIR/archived.json and removed,
+# under the "metrics" lock that scrapes take too, so a respawned worker never
+# shows up as a counter reset.
+
+METRICS_DIR = settings.METRICS_DIR
+FLUSH_SECONDS = settings.METRICS_FLUSH_SECONDS
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_collectors = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def samples(self) -> dict:
+        with self._lock:
+            return {json.dumps(key): value for key, value in self._values.items()}
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # Per-bucket (not cumulative) counts, then sum and count
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[position] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> dict:
+        with self._lock:
+            return {json.dumps(key): list(state) for key, state in self._values.items()}
+
+
+def on_collect(collector):
+    """Register `collector()` to update gauges right before values are written out."""
+    _collectors.append(collector)
+    return collector
+
+
+def snapshot() -> dict:
+    for collector in _collectors:
+        collector()
+    return {
+        metric.name: {"samples": metric.samples()}
+        for metric in _registry
+    }
+
+
+# --- Multi-process files ---
+def _path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.json")
+
+
+ARCHIVE_PATH = os.path.join(METRICS_DIR, "archived.json")
+
+
+def _write(path: str, data: dict):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read(path: str) -> Optional[dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def flush():
+    """Write this process's values where the other workers' scrapes can read them."""
+    _write(_path(os.getpid()), snapshot())
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _worker_files():
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext == ".json" and stem.isdigit():
+            yield int(stem), os.path.join(METRICS_DIR, name)
+
+
+def _merge(total, value):
+    if isinstance(value, list):
+        return value if total is None else [a + b for a, b in zip(total, value)]
+    return value if total is None else total + value
+
+
+def _fold(merged: dict, data: dict, kinds: dict, alive: bool):
+    for name, values in data.items():
+        if name not in merged or (kinds[name] == "gauge" and not alive):
+            continue
+        target = merged[name]
+        for key, value in values["samples"].items():
+            target[key] = _merge(target.get(key), value)
+
+
+def collect() -> dict:
+    """{metric name: {label key: value}} summed over the archive and every worker's latest file."""
+    flush()
+    merged = {metric.name: {} for metric in _registry}
+    kinds = {metric.name: metric.kind for metric in _registry}
+    # Not while a starting worker moves dead workers' files into the archive
+    with coordination.exclusive("metrics"):
+        archived = _read(ARCHIVE_PATH)
+        if archived is not None:
+            _fold(merged, archived, kinds, alive=False)
+        for pid, path in _worker_files():
+            data = _read(path)
+            if data is None:
+                continue  # being replaced right now; its next flush will count
+            _fold(merged, data, kinds, alive=_alive(pid))
+    return merged
+
+
+def _archive_dead_workers():
+    # Fold the counters and histograms of exited workers into the archive,
+    # then drop their files; their gauges go with them
+    with coordination.exclusive("metrics"):
+        stale = [(pid, path) for pid, path in _worker_files() if pid == os.getpid() or not _alive(pid)]
+        if not stale:
+            return
+        kinds = {metric.name: metric.kind for metric in _registry}
+        merged = {name: {} for name, kind in kinds.items() if kind != "gauge"}
+        archived = _read(ARCHIVE_PATH)
+        if archived is not None:
+            _fold(merged, archived, kinds, alive=False)
+        for _, path in stale:
+            data = _read(path)
+            if data is not None:
+                _fold(merged, data, kinds, alive=False)
+        _write(ARCHIVE_PATH, {name: {"samples": samples} for name, samples in merged.items()})
+        for _, path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+# --- Exposition ---
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render() -> str:
+    """Every metric, summed over all workers, in the Prometheus text format."""
+    merged = collect()
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for key, value in sorted(merged[metric.name].items()):
+            label_values = json.loads(key)
+            if metric.kind != "histogram":
+                lines.append(f"{metric.name}{_labels(metric.labels, label_values)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), value):
+                cumulative += count
+                le = (("le", _number(bound)),)
+                lines.append(f"{metric.name}_bucket{_labels(metric.labels, label_values, le)} {cumulative}")
+            lines.append(f"{metric.name}_sum{_labels(metric.labels, label_values)} {_number(value[-2])}")
+            lines.append(f"{metric.name}_count{_labels(metric.labels, label_values)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Background flushing ---
+_stop: Optional[threading.Event] = None
+
+
+def _flush_loop(stop: threading.Event):
+    while not stop.wait(FLUSH_SECONDS):
+        try:
+            flush()
+        except OSError:
+            pass  # try again next round
+
+
+def start():
+    """Archive files left by dead workers and flush this worker's values periodically."""
+    global _stop
+    _archive_dead_workers()
+    if _stop is None:
+        _stop = threading.Event()
+        threading.Thread(target=_flush_loop, args=(_stop,), name="vines-metrics", daemon=True).start()
+
+
+def stop():
+    global _stop
+    if _stop is not None:
+        _stop.set()
+        _stop = None
+    try:
+        flush()
+    except OSError:
+        pass
+
+
+# --- What the app measures ---
+REQUESTS = Counter("vines_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+REQUEST_SECONDS = Histogram("vines_http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+IN_FLIGHT = Gauge("vines_http_requests_in_flight", "HTTP requests being served.")
+
+POOL_CHECKOUTS = Counter("vines_db_pool_checkouts_total", "Connections taken from a SQLAlchemy pool.", ("pool",))
+POOL_WAIT_SECONDS = Histogram(
+    "vines_db_pool_wait_seconds", "Time spent waiting for a pooled connection.", ("pool",),
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+POOL_CHECKED_OUT = Gauge("vines_db_pool_checked_out", "Connections currently checked out.", ("pool",))
+POOL_SIZE = Gauge("vines_db_pool_size", "Configured pool size.", ("pool",))
+
+UPLOADS = Counter("vines_image_uploads_total", "Admin image uploads by outcome.", ("outcome",))
+UPLOAD_BYTES = Counter("vines_image_upload_bytes_total", "Bytes received in admin image uploads.")
+UPLOAD_SECONDS = Histogram(
+    "vines_image_upload_duration_seconds", "Storing an upload; its variants are built later by a process_image job.",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+JOBS = Counter("vines_jobs_total", "Background jobs by kind and outcome (done, retry, failed).", ("kind", "outcome"))
+JOB_SECONDS = Histogram(
+    "vines_job_duration_seconds", "Time spent running a background job.", ("kind",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+LOGINS = Counter("vines_login_attempts_total", "Admin login attempts by outcome.", ("outcome",))
+LOGIN_SECONDS = Histogram("vines_login_duration_seconds", "Admin login checks, including password hashing.")
+
+
+# --- SQLAlchemy pools ---
+_pools = {}
+
+
+def timed_pool(pool_class, name: str):
+    """A `pool_class` subclass that records checkouts and the time spent waiting for them."""
+
+    class TimedPool(pool_class):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            _pools[name] = self  # the newest pool, after a dispose() too
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            finally:
+                POOL_WAIT_SECONDS.observe(time.perf_counter() - started, pool=name)
+            POOL_CHECKOUTS.inc(pool=name)
+            return connection
+
+    TimedPool.__name__ = TimedPool.__qualname__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+@on_collect
+def _pool_gauges():
+    for name, pool in _pools.items():
+        POOL_CHECKED_OUT.set(pool.checkedout(), pool=name)
+        POOL_SIZE.set(pool.size(), pool=name)
@@ -0,0 +1,110 @@
+import importlib
+import pkgutil
+import re
+from typing import List, Optional
+
+# Versioned schema migrations.
+#
+# Each vNNNN_<name>.py module in this package defines `upgrade(conn)`, which
+# gets a plain sqlite3 connection inside an open transaction. The schema
+# version lives in SQLite's PRAGMA user_version, bumped in the same
+# transaction as the migration, so a failed migration leaves the database
+# exactly as it was. Run them with `python -m app.migrations upgrade`;
+# the app refuses to start on a database that is behind (see check()).
+
+_MODULE = re.compile(r"^v(\d{4})_\w+$")
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def run_script(conn, script: str):
+    """Execute `;`-separated statements in the current transaction.
+
+    sqlite3's executescript() would COMMIT first, which breaks atomicity.
+    """
+    for statement in script.split(";"):
+        lines = [line for line in statement.splitlines() if not line.strip().startswith("--")]
+        if "".join(lines).strip():
+            conn.execute("\n".join(lines))
+
+
+def migrations():
+    """All migrations as a sorted list of (version, module name)."""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE.match(info.name)
+        if match:
+            found.append((int(match.group(1)), info.name))
+    return sorted(found)
+
+
+def head() -> int:
+    found = migrations()
+    return found[-1][0] if found else 0
+
+
+def current_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _apply(conn, version: int, name: str):
+    module = importlib.import_module(f"{__name__}.{name}")
+    # Table rebuilds need foreign keys off, and the pragma is a no-op inside
+    # a transaction, so it is switched before BEGIN and checked before COMMIT.
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        module.upgrade(conn)
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            raise RuntimeError(f"{name} leaves {len(violations)} foreign key violation(s), e.g. {violations[0]}")
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+
+
+def upgrade(engine, target: Optional[int] = None) -> List[str]:
+    """Apply every migration above the database's version (up to `target`); returns their names."""
+    applied = []
+    raw = engine.raw_connection()
+    conn = raw.driver_connection
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # explicit BEGIN/COMMIT in _apply
+    try:
+        version = current_version(conn)
+        for number, name in migrations():
+            if number <= version or (target is not None and number > target):
+                continue
+            _apply(conn, number, name)
+            applied.append(name)
+    finally:
+        conn.isolation_level = isolation_level
+        raw.close()
+    return applied
+
+
+def status(engine):
+    """(database version, latest version)."""
+    raw = engine.raw_connection()
+    try:
+        return current_version(raw.driver_connection), head()
+    finally:
+        raw.close()
+
+
+def check(engine):
+    """Raise SchemaOutOfDate unless the database is at the latest version."""
+    version, latest = status(engine)
+    if version < latest:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version}, the code needs {latest}. "
+            "Run `python -m app.migrations upgrade`."
+        )
+    if version > latest:
+        raise SchemaOutOfDate(f"Database schema version {version} is newer than this code ({latest}).")
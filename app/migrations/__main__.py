@@ -0,0 +1,34 @@
+import argparse
+import sys
+from . import upgrade, status, migrations
+from ..database import engine
+
+# python -m app.migrations upgrade [--to N]
+# python -m app.migrations status
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    up = commands.add_parser("upgrade", help="apply pending migrations")
+    up.add_argument("--to", type=int, default=None, help="stop at this version")
+    commands.add_parser("status", help="show the database and code versions")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        applied = upgrade(engine, args.to)
+        for name in applied:
+            print(f"Applied {name}")
+        version, _ = status(engine)
+        print(f"Database is at version {version}" + ("" if applied else " (nothing to do)"))
+        return 0
+
+    version, latest = status(engine)
+    for number, name in migrations():
+        print(f"{'x' if number <= version else ' '} {name}")
+    print(f"Database is at version {version} of {latest}")
+    return 0 if version == latest else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
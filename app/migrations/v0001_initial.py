@@ -0,0 +1,48 @@
+# The schema as main.py used to create it with metadata.create_all.
+# IF NOT EXISTS lets databases created that way adopt the migrations as-is.
+
+from . import run_script
+
+
+def upgrade(conn):
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER NOT NULL,
+            name_en VARCHAR NOT NULL,
+            name_ar VARCHAR NOT NULL,
+            slug VARCHAR NOT NULL,
+            image VARCHAR,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_categories_id ON categories (id);
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_categories_slug ON categories (slug);
+
+        CREATE TABLE IF NOT EXISTS admins (
+            id INTEGER NOT NULL,
+            username VARCHAR NOT NULL,
+            password_hash VARCHAR NOT NULL,
+            role VARCHAR,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id)
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_admins_username ON admins (username);
+        CREATE INDEX IF NOT EXISTS ix_admins_id ON admins (id);
+
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            name_en VARCHAR NOT NULL,
+            name_ar VARCHAR NOT NULL,
+            code VARCHAR NOT NULL,
+            weight VARCHAR NOT NULL,
+            description_en TEXT,
+            description_ar TEXT,
+            image VARCHAR,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id),
+            FOREIGN KEY(category_id) REFERENCES categories (id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_products_id ON products (id);
+        CREATE UNIQUE INDEX IF NOT EXISTS ix_products_code ON products (code);
+    """)
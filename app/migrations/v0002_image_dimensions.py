@@ -0,0 +1,10 @@
+# Pixel size of the uploaded original, used for the responsive variants
+# (see app/images.py). Databases created by create_all after that change
+# already have the columns.
+
+
+def upgrade(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+    for column in ("image_width", "image_height"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE products ADD COLUMN {column} INTEGER")
@@ -0,0 +1,45 @@
+# Indexes for the product listing and the category filter, and
+# ON DELETE CASCADE from products to their category.
+#
+# SQLite cannot alter a foreign key, so products is rebuilt with the
+# documented create-copy-drop-rename sequence (foreign keys are off while
+# migrations run).
+
+from . import run_script
+
+
+def upgrade(conn):
+    run_script(conn, """
+        CREATE TABLE products_new (
+            id INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            name_en VARCHAR NOT NULL,
+            name_ar VARCHAR NOT NULL,
+            code VARCHAR NOT NULL,
+            weight VARCHAR NOT NULL,
+            description_en TEXT,
+            description_ar TEXT,
+            image VARCHAR,
+            image_width INTEGER,
+            image_height INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id),
+            FOREIGN KEY(category_id) REFERENCES categories (id) ON DELETE CASCADE
+        );
+        INSERT INTO products_new (id, category_id, name_en, name_ar, code, weight, description_en,
+                                  description_ar, image, image_width, image_height, created_at)
+        SELECT id, category_id, name_en, name_ar, code, weight, description_en,
+               description_ar, image, image_width, image_height, created_at
+        FROM products;
+        DROP TABLE products;
+        ALTER TABLE products_new RENAME TO products;
+
+        CREATE INDEX ix_products_id ON products (id);
+        CREATE UNIQUE INDEX ix_products_code ON products (code);
+        -- Newest-first listing: ORDER BY created_at DESC, id DESC
+        CREATE INDEX ix_products_created_at_id ON products (created_at, id);
+        -- Category pages: WHERE category_id = ? ORDER BY created_at DESC, id DESC
+        CREATE INDEX ix_products_category_created_at_id ON products (category_id, created_at, id);
+        -- Finding the products that still use an uploaded image (app/storage.py)
+        CREATE INDEX ix_products_image ON products (image);
+    """)
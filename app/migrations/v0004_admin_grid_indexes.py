@@ -0,0 +1,10 @@
+# The admin product grid sorts by name as well as by date and code
+# (created_at and code are already indexed).
+
+from . import run_script
+
+
+def upgrade(conn):
+    run_script(conn, """
+        CREATE INDEX IF NOT EXISTS ix_products_name_en_id ON products (name_en, id);
+    """)
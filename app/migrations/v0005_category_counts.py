@@ -0,0 +1,56 @@
+# Per-category product counts for the /products sidebar.
+#
+# category_counts holds one row per category and is kept current by
+# triggers, so adding, importing, moving or deleting products (through the
+# ORM or a bulk statement) adjusts a single counter instead of anyone
+# running a GROUP BY over products. Deleting a category removes its row
+# through the foreign key.
+
+from . import run_script
+
+TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_categories_counts_insert AFTER INSERT ON categories
+    BEGIN
+        INSERT OR IGNORE INTO category_counts (category_id, product_count) VALUES (NEW.id, 0);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_products_counts_insert AFTER INSERT ON products
+    BEGIN
+        UPDATE category_counts SET product_count = product_count + 1 WHERE category_id = NEW.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_products_counts_delete AFTER DELETE ON products
+    BEGIN
+        UPDATE category_counts SET product_count = product_count - 1 WHERE category_id = OLD.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_products_counts_move AFTER UPDATE OF category_id ON products
+    WHEN OLD.category_id IS NOT NEW.category_id
+    BEGIN
+        UPDATE category_counts SET product_count = product_count - 1 WHERE category_id = OLD.category_id;
+        UPDATE category_counts SET product_count = product_count + 1 WHERE category_id = NEW.category_id;
+    END
+    """,
+)
+
+
+def upgrade(conn):
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS category_counts (
+            category_id INTEGER NOT NULL,
+            product_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category_id),
+            FOREIGN KEY(category_id) REFERENCES categories (id) ON DELETE CASCADE
+        );
+        INSERT OR REPLACE INTO category_counts (category_id, product_count)
+            SELECT categories.id, COUNT(products.id)
+            FROM categories LEFT JOIN products ON products.category_id = categories.id
+            GROUP BY categories.id;
+    """)
+    # Trigger bodies contain semicolons, so they cannot go through run_script
+    for trigger in TRIGGERS:
+        conn.execute(trigger)
@@ -0,0 +1,49 @@
+# Change counters for running several workers against one database.
+#
+# change_versions holds one counter per kind of derived data: "catalog"
+# (snapshot, page cache, typeahead index) and "auth" (cached principals
+# and revocations). Triggers bump the counter in the same transaction as
+# the write, whichever worker or script makes it, and every worker polls
+# the counters (app/coordination.py) to drop what it derived from older
+# data. revoked_tokens makes a logout in one worker stick in the others.
+
+from . import run_script
+
+# (counter, table, event) for every write that makes derived data stale
+WATCHED = (
+    ("catalog", "categories", "INSERT"),
+    ("catalog", "categories", "UPDATE"),
+    ("catalog", "categories", "DELETE"),
+    ("catalog", "products", "INSERT"),
+    ("catalog", "products", "UPDATE"),
+    ("catalog", "products", "DELETE"),
+    ("auth", "admins", "UPDATE"),
+    ("auth", "admins", "DELETE"),
+    ("auth", "revoked_tokens", "INSERT"),
+)
+
+
+def upgrade(conn):
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS change_versions (
+            name VARCHAR NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name)
+        );
+        INSERT OR IGNORE INTO change_versions (name, version) VALUES ('catalog', 0);
+        INSERT OR IGNORE INTO change_versions (name, version) VALUES ('auth', 0);
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            jti VARCHAR NOT NULL,
+            expires_at FLOAT NOT NULL,
+            PRIMARY KEY (jti)
+        );
+        CREATE INDEX IF NOT EXISTS ix_revoked_tokens_expires_at ON revoked_tokens (expires_at);
+    """)
+    # Trigger bodies contain semicolons, so they cannot go through run_script
+    for name, table, event in WATCHED:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_bump_{name}_{event.lower()} AFTER {event} ON {table}
+            BEGIN
+                UPDATE change_versions SET version = version + 1 WHERE name = '{name}';
+            END
+        """)
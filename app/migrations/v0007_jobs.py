@@ -0,0 +1,32 @@
+# Background jobs (app/jobs.py).
+#
+# One row per job; workers pick due rows by (status, run_after). A queued
+# job with a unique_key is the only queued job with that key, which is how
+# repeated requests for the same work (catalog refreshes, the periodic
+# uploads sweep) collapse into one.
+
+from . import run_script
+
+
+def upgrade(conn):
+    run_script(conn, """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER NOT NULL,
+            kind VARCHAR NOT NULL,
+            payload TEXT NOT NULL DEFAULT '{}',
+            status VARCHAR NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_after FLOAT NOT NULL,
+            unique_key VARCHAR,
+            locked_by VARCHAR,
+            locked_at FLOAT,
+            last_error TEXT,
+            result TEXT,
+            created_at FLOAT NOT NULL,
+            finished_at FLOAT,
+            PRIMARY KEY (id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after);
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_jobs_queued_unique_key ON jobs (unique_key) WHERE status = 'queued';
+    """)
@@ -0,0 +1,29 @@
+# Drift detection for the full-text index (app/search.py).
+#
+# The "search" counter in change_versions is bumped by every write that
+# changes what products_fts holds for a product: inserts, deletes (the
+# category cascade included) and updates of the indexed columns. The index
+# records the counter value it was last brought in step with in
+# search_index_state, together with the index format. Writes through the
+# ORM or app/bulk.py move both; anything else (a script, the sqlite3 shell)
+# only moves the counter, and search.ensure_index() rebuilds on the mismatch.
+
+from . import run_script
+
+
+def upgrade(conn):
+    run_script(conn, """
+        INSERT OR IGNORE INTO change_versions (name, version) VALUES ('search', 0);
+        CREATE TABLE IF NOT EXISTS search_index_state (
+            format INTEGER NOT NULL,
+            version INTEGER NOT NULL
+        );
+    """)
+    # Trigger bodies contain semicolons, so they cannot go through run_script
+    for event in ("INSERT", "DELETE", "UPDATE OF name_en, name_ar, code, category_id"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_bump_search_{event.split()[0].lower()} AFTER {event} ON products
+            BEGIN
+                UPDATE change_versions SET version = version + 1 WHERE name = 'search';
+            END
+        """)
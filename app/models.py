@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, Text, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from .database import Base
 
 class Category(Base):
@@ -13,24 +13,81 @@ class Category(Base):
     image = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    products = relationship("Product", back_populates="category", cascade="all, delete-orphan")
+    # The database deletes a category's products (ON DELETE CASCADE)
+    products = relationship("Product", back_populates="category", cascade="all, delete-orphan", passive_deletes=True)
 
 class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False)
     name_en = Column(String, nullable=False)
     name_ar = Column(String, nullable=False)
     code = Column(String, unique=True, index=True, nullable=False)
     weight = Column(String, nullable=False)
     description_en = Column(Text, nullable=True)
     description_ar = Column(Text, nullable=True)
-    image = Column(String, nullable=True)
+    image = Column(String, nullable=True, index=True)
+    image_width = Column(Integer, nullable=True)
+    image_height = Column(Integer, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     category = relationship("Category", back_populates="products")
 
+    # Schema changes go through app/migrations; keep these in step with it
+    __table_args__ = (
+        Index("ix_products_created_at_id", "created_at", "id"),
+        Index("ix_products_category_created_at_id", "category_id", "created_at", "id"),
+        Index("ix_products_name_en_id", "name_en", "id"),
+    )
+
+class CategoryCount(Base):
+    # Maintained by triggers on products and categories (migration v0005);
+    # the app only reads it
+    __tablename__ = "category_counts"
+
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    product_count = Column(Integer, nullable=False, default=0)
+
+class ChangeVersion(Base):
+    # Bumped by triggers on every catalog or admin write (migration v0006);
+    # workers poll these to notice each other's writes
+    __tablename__ = "change_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class RevokedToken(Base):
+    # Logged-out tokens, so every worker refuses them until they expire
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String, primary_key=True)
+    expires_at = Column(Float, nullable=False, index=True)
+
+class Job(Base):
+    # Background work queued by admin requests (app/jobs.py, migration v0007)
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="{}")  # JSON
+    status = Column(String, nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    run_after = Column(Float, nullable=False)  # epoch seconds
+    unique_key = Column(String)
+    locked_by = Column(String)
+    locked_at = Column(Float)
+    last_error = Column(Text)
+    result = Column(Text)
+    created_at = Column(Float, nullable=False)
+    finished_at = Column(Float)
+
+    __table_args__ = (
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+        Index("ux_jobs_queued_unique_key", "unique_key", unique=True, sqlite_where=text("status = 'queued'")),
+    )
+
 class Admin(Base):
     __tablename__ = "admins"
 
@@ -0,0 +1,138 @@
+import base64
+import json
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import catalog, search
+
+# Keyset (cursor) pagination over the catalog snapshot.
+#
+# A cursor carries the sort key of the last item on the previous page, and
+# the next page starts right after it (a bisect into a presorted list, or
+# for a search a bound in the FTS query), so every page costs the same
+# however deep into the catalog the visitor is.
+
+PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Search facets by (snapshot version, query). Every page of a search shows
+# the same counts, so only the first one pays for the aggregate query.
+FACET_CACHE_SIZE = 256
+_facet_cache = OrderedDict()
+
+
+def encode_cursor(mode: str, values) -> str:
+    raw = json.dumps([mode, *values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, mode: str) -> list:
+    """Return the key values stored in `cursor`; raises ValueError if it is not a `mode` cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(data, list) or len(data) != 3 or data[0] != mode:
+        raise ValueError("Cursor does not match this listing")
+    return data[1:]
+
+
+def _newest_page(snapshot, category_id, cursor, limit):
+    # Newest first on (created_at, id)
+    bound = None
+    if cursor:
+        created_at, product_id = decode_cursor(cursor, "new")
+        try:
+            bound = (datetime.fromisoformat(created_at), int(product_id))
+        except (TypeError, ValueError):
+            raise ValueError("Malformed cursor")
+
+    items, more = snapshot.listing_for(category_id).page_before(bound, limit)
+    next_cursor = None
+    if more and items:
+        created_at, product_id = items[-1].sort_key
+        next_cursor = encode_cursor("new", (created_at.isoformat(), product_id))
+    return list(items), next_cursor
+
+
+async def _ranked_page(snapshot, db, search_term, category_id, cursor, limit):
+    # Best matches first on (score, id); the FTS query applies the cursor and limit
+    after = None
+    if cursor:
+        score, product_id = decode_cursor(cursor, "rank")
+        try:
+            after = (float(score), int(product_id))
+        except (TypeError, ValueError):
+            raise ValueError("Malformed cursor")
+
+    # One more than a page, to tell whether there is a next one
+    keys = await search.ranked_page(db, search_term, limit + 1, category_id, after)
+    if keys is None:
+        keys = _scan_page(snapshot, search_term, category_id, after, limit + 1)
+
+    products = snapshot.products_by_id
+    items = [products[product_id] for _, product_id in keys[:limit] if product_id in products]
+    next_cursor = None
+    if len(keys) > limit:
+        next_cursor = encode_cursor("rank", keys[limit - 1])
+    return items, next_cursor
+
+
+def _scan_page(snapshot, search_term, category_id, after, limit):
+    # No FTS index: substring match over the snapshot
+    keys = search.scan(snapshot, search_term)
+    if category_id:
+        products = snapshot.products_by_id
+        keys = [key for key in keys if products[key[1]].category_id == category_id]
+    start = bisect_right(keys, after) if after else 0
+    return keys[start:start + limit]
+
+
+async def _search_facets(snapshot, db, search_term):
+    key = (snapshot.version, search_term)
+    facets = _facet_cache.get(key)
+    if facets is not None:
+        _facet_cache.move_to_end(key)
+        return facets
+    counts = await search.category_counts(db, search_term)
+    if counts is None:
+        facets = snapshot.facet_counts(search.scan(snapshot, search_term))
+    else:
+        facets = {**dict.fromkeys(snapshot.categories_by_id, 0), **counts}
+    _facet_cache[key] = facets
+    if len(_facet_cache) > FACET_CACHE_SIZE:
+        _facet_cache.popitem(last=False)
+    return facets
+
+
+async def product_page(db: AsyncSession, category_id: Optional[int] = None, search_term: Optional[str] = None,
+                       cursor: Optional[str] = None, limit: int = PAGE_SIZE):
+    """One page of the public product listing as (records, next_cursor).
+
+    Reads from the catalog snapshot; only searches touch the database, and
+    then just the FTS index. Raises ValueError for a cursor that does not
+    belong to this listing.
+    """
+    snapshot = catalog.current()
+    if search_term:
+        return await _ranked_page(snapshot, db, search_term, category_id, cursor, limit)
+    return _newest_page(snapshot, category_id, cursor, limit)
+
+
+async def product_page_with_facets(db: AsyncSession, category_id: Optional[int] = None, search_term: Optional[str] = None,
+                                   cursor: Optional[str] = None, limit: int = PAGE_SIZE):
+    """product_page() plus {category_id: count} for the sidebar, as (records, next_cursor, facets).
+
+    Without a search the counts are the precomputed per-category totals;
+    with one they come from an aggregate query over the search index,
+    ignoring the category filter so every category shows its share.
+    """
+    snapshot = catalog.current()
+    if search_term:
+        items, next_cursor = await _ranked_page(snapshot, db, search_term, category_id, cursor, limit)
+        return items, next_cursor, await _search_facets(snapshot, db, search_term)
+    items, next_cursor = _newest_page(snapshot, category_id, cursor, limit)
+    return items, next_cursor, snapshot.facet_counts()
@@ -1,53 +1,79 @@
-from fastapi import APIRouter, Request, Depends, Form, File, UploadFile, status
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from .. import database, models, auth
-import shutil
-import os
+import tempfile
+import time
+from typing import List, Optional
+from fastapi import APIRouter, Request, Depends, Form, File, UploadFile, HTTPException, Query, status
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import database, models, schemas, auth, catalog, storage, bulk, grid, metrics, jobs, settings
+from ..templating import templates
 
 router = APIRouter(prefix="/admin", tags=["admin"])
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/login", response_class=HTMLResponse)
 def login_page(request: Request):
     return templates.TemplateResponse("admin/login.html", {"request": request})
 
+# A read session: the password check runs in the hash pool while the session
+# is open, and holding the writer's only connection meanwhile would queue
+# every login (and every admin write) behind it
 @router.post("/login")
-async def login(request: Request, username: str = Form(...), password: str = Form(...), db: Session = Depends(database.get_db)):
-    user = auth.authenticate_user(db, username, password)
+async def login(request: Request, username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(database.get_read_db)):
+    try:
+        user = await auth.authenticate_user(db, username, password)
+    except auth.HasherBusy:
+        return templates.TemplateResponse("admin/login.html", {"request": request, "error": "Too many login attempts, please try again"}, status_code=503)
     if not user:
          return templates.TemplateResponse("admin/login.html", {"request": request, "error": "Invalid credentials"})
     
-    access_token = auth.create_access_token(data={"sub": user.username})
+    access_token = auth.create_access_token(data={"sub": user.username, "uid": user.id, "role": user.role})
     response = RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
     response.set_cookie(key="access_token", value=f"Bearer {access_token}", httponly=True)
     return response
 
 @router.get("/logout")
-def logout():
+def logout(request: Request):
+    auth.revoke_token(request.cookies.get("access_token"))
     response = RedirectResponse(url="/admin/login", status_code=status.HTTP_303_SEE_OTHER)
     response.delete_cookie(key="access_token")
     return response
 
 @router.get("/dashboard")
-def dashboard(request: Request, user: models.Admin = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+async def dashboard(request: Request, user: auth.Principal = Depends(auth.get_current_user), db: AsyncSession = Depends(database.get_read_db)):
     if not user:
         return RedirectResponse(url="/admin/login")
     
-    products = db.query(models.Product).all()
-    categories = db.query(models.Category).all()
+    # Products are fetched page by page by the grid (see product_grid below)
+    await catalog.ready()
+    categories = (await db.execute(select(models.Category).order_by(models.Category.name_en))).scalars().all()
     return templates.TemplateResponse("admin/dashboard.html", {
         "request": request, 
         "user": user, 
-        "products": products,
-        "categories": categories
+        "product_count": len(catalog.current().products_by_id),
+        "categories": categories,
+        "per_page": grid.PER_PAGE,
     })
 
+@router.get("/api/products", response_model=schemas.AdminProductGrid)
+async def product_grid(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(grid.PER_PAGE, ge=1, le=grid.MAX_PER_PAGE),
+    sort: str = "created_at", order: str = "desc",
+    category_id: Optional[int] = None, q: Optional[str] = None,
+    user: auth.Principal = Depends(auth.login_required),
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    await catalog.ready()
+    try:
+        return await grid.product_grid(db, page, per_page, sort, order, category_id, q)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
 # --- Super Admin: User Management ---
 @router.get("/users")
-def manage_users(request: Request, user: models.Admin = Depends(auth.get_current_active_superuser), db: Session = Depends(database.get_db)):
-    admins = db.query(models.Admin).all()
+async def manage_users(request: Request, user: auth.Principal = Depends(auth.get_current_active_superuser), db: AsyncSession = Depends(database.get_read_db)):
+    admins = (await db.execute(select(models.Admin))).scalars().all()
     return templates.TemplateResponse("admin/users.html", {
         "request": request,
         "user": user,
@@ -55,35 +81,68 @@ def manage_users(request: Request, user: models.Admin = Depends(auth.get_current
     })
 
 @router.post("/users/add")
-def add_admin(
+async def add_admin(
     username: str = Form(...), password: str = Form(...), role: str = Form(...),
-    current_user: models.Admin = Depends(auth.get_current_active_superuser),
-    db: Session = Depends(database.get_db)
+    current_user: auth.Principal = Depends(auth.get_current_active_superuser),
+    db: AsyncSession = Depends(database.get_db)
 ):
     # Check if username exists
-    if db.query(models.Admin).filter(models.Admin.username == username).first():
+    if (await db.execute(select(models.Admin.id).where(models.Admin.username == username))).first():
         # Ideally return error, simplified for now
         return RedirectResponse(url="/admin/users?error=UsernameExists", status_code=status.HTTP_303_SEE_OTHER)
     
-    password_hash = auth.get_password_hash(password)
+    try:
+        password_hash = await auth.hash_password(password)
+    except auth.HasherBusy:
+        return RedirectResponse(url="/admin/users?error=Busy", status_code=status.HTTP_303_SEE_OTHER)
     new_admin = models.Admin(username=username, password_hash=password_hash, role=role)
     db.add(new_admin)
-    db.commit()
+    await db.commit()
     return RedirectResponse(url="/admin/users", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/users/delete/{admin_id}")
-def delete_admin(
+async def delete_admin(
     admin_id: int,
-    current_user: models.Admin = Depends(auth.get_current_active_superuser),
-    db: Session = Depends(database.get_db)
+    current_user: auth.Principal = Depends(auth.get_current_active_superuser),
+    db: AsyncSession = Depends(database.get_db)
 ):
-    admin_to_delete = db.query(models.Admin).filter(models.Admin.id == admin_id).first()
+    admin_to_delete = await db.get(models.Admin, admin_id)
     if admin_to_delete and admin_to_delete.id != current_user.id: # Prevent self-delete
-        db.delete(admin_to_delete)
-        db.commit()
+        await db.delete(admin_to_delete)
+        await db.commit()
+        auth.revoke_admin(admin_id)
     return RedirectResponse(url="/admin/users", status_code=status.HTTP_303_SEE_OTHER)
 
 # --- Product CRUD ---
+async def _store_image(image: UploadFile, db: AsyncSession):
+    """Store an uploaded image; returns (url, width, height).
+
+    The size is None for new images: their variants are built by a
+    process_image job (app/tasks.py) after the product is saved.
+    """
+    started = time.perf_counter()
+    try:
+        stored = await storage.save_upload(image)
+    except storage.UploadRejected:
+        metrics.UPLOADS.inc(outcome="rejected")
+        raise
+    metrics.UPLOAD_BYTES.inc(stored.size)
+    try:
+        if not stored.created:
+            # Identical bytes are already stored, variants included
+            existing = (await db.execute(
+                select(models.Product.image_width, models.Product.image_height).where(
+                    models.Product.image == stored.url, models.Product.image_width.isnot(None)
+                ).limit(1)
+            )).first()
+            if existing:
+                metrics.UPLOADS.inc(outcome="duplicate")
+                return stored.url, existing.image_width, existing.image_height
+        metrics.UPLOADS.inc(outcome="stored")
+        return stored.url, None, None
+    finally:
+        metrics.UPLOAD_SECONDS.observe(time.perf_counter() - started)
+
 @router.post("/products/add")
 async def add_product(
     request: Request,
@@ -92,43 +151,47 @@ async def add_product(
     category_id: int = Form(...),
     description_en: str = Form(""), description_ar: str = Form(""),
     image: UploadFile = File(None),
-    user: models.Admin = Depends(auth.login_required),
-    db: Session = Depends(database.get_db)
+    user: auth.Principal = Depends(auth.login_required),
+    db: AsyncSession = Depends(database.get_db)
 ):
-    image_path = None
+    image_path = image_width = image_height = None
     if image and image.filename:
-        # Save image
-        upload_dir = "app/static/uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        filename = f"{code}_{image.filename}" # Unique-ify
-        file_location = f"{upload_dir}/{filename}"
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(image.file, file_object)
-        image_path = f"/static/uploads/{filename}"
+        try:
+            image_path, image_width, image_height = await _store_image(image, db)
+        except storage.UploadRejected:
+            return RedirectResponse(url="/admin/dashboard?error=InvalidImage", status_code=status.HTTP_303_SEE_OTHER)
 
     new_product = models.Product(
         name_en=name_en, name_ar=name_ar,
         code=code, weight=weight,
         category_id=category_id,
         description_en=description_en, description_ar=description_ar,
-        image=image_path
+        image=image_path,
+        image_width=image_width,
+        image_height=image_height
     )
     try:
         db.add(new_product)
-        db.commit()
+        if image_path and image_width is None:
+            await jobs.add(db, "process_image", {"url": image_path})
+        await jobs.add(db, "refresh_catalog", unique=True)
+        await db.commit()
     except Exception:
-        db.rollback()
-        # Handle unique logic error if needed
-        pass
+        await db.rollback()
+        # Handle unique logic error if needed; don't leave the image behind
+        await storage.release(db, image_path)
         
     return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/products/delete/{product_id}")
-def delete_product(product_id: int, user: models.Admin = Depends(auth.login_required), db: Session = Depends(database.get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+async def delete_product(product_id: int, user: auth.Principal = Depends(auth.login_required), db: AsyncSession = Depends(database.get_db)):
+    product = await db.get(models.Product, product_id)
     if product:
-        db.delete(product)
-        db.commit()
+        await db.delete(product)
+        if product.image:
+            await jobs.add(db, "release_images", {"urls": [product.image]})
+        await jobs.add(db, "refresh_catalog", unique=True)
+        await db.commit()
     return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/products/edit/{product_id}")
@@ -140,10 +203,10 @@ async def edit_product(
     category_id: int = Form(...),
     description_en: str = Form(""), description_ar: str = Form(""),
     image: UploadFile = File(None),
-    user: models.Admin = Depends(auth.login_required),
-    db: Session = Depends(database.get_db)
+    user: auth.Principal = Depends(auth.login_required),
+    db: AsyncSession = Depends(database.get_db)
 ):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    product = await db.get(models.Product, product_id)
     if not product:
         return RedirectResponse(url="/admin/dashboard?error=ProductNotFound", status_code=status.HTTP_303_SEE_OTHER)
     
@@ -156,121 +219,88 @@ async def edit_product(
     product.description_en = description_en
     product.description_ar = description_ar
 
+    old_image = product.image
     if image and image.filename:
-        # Save new image
-        upload_dir = "app/static/uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        filename = f"{code}_{image.filename}"
-        file_location = f"{upload_dir}/{filename}"
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(image.file, file_object)
-        product.image = f"/static/uploads/{filename}"
+        try:
+            product.image, product.image_width, product.image_height = await _store_image(image, db)
+        except storage.UploadRejected:
+            await db.rollback()
+            return RedirectResponse(url="/admin/dashboard?error=InvalidImage", status_code=status.HTTP_303_SEE_OTHER)
 
+    new_image = product.image
     try:
-        db.commit()
+        if new_image != old_image:
+            if product.image_width is None:
+                await jobs.add(db, "process_image", {"url": new_image})
+            if old_image:
+                await jobs.add(db, "release_images", {"urls": [old_image]})
+        await jobs.add(db, "refresh_catalog", unique=True)
+        await db.commit()
     except Exception:
-        db.rollback()
+        await db.rollback()
+        # Don't leave the new image behind
+        if new_image != old_image:
+            await storage.release(db, new_image)
     
     return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 
-# --- Category CRUD ---
-@router.post("/categories/add")
-async def add_category(
-    name_en: str = Form(...), name_ar: str = Form(...),
-    slug: str = Form(...),
-    user: models.Admin = Depends(auth.login_required),
-    db: Session = Depends(database.get_db)
-):
-    new_cat = models.Category(
-        name_en=name_en, name_ar=name_ar,
-        slug=slug
-    )
-    try:
-        db.add(new_cat)
-        db.commit()
-    except Exception:
-        db.rollback()
-    return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-
-@router.post("/categories/delete/{category_id}")
-def delete_category(category_id: int, user: models.Admin = Depends(auth.login_required), db: Session = Depends(database.get_db)):
-    cat = db.query(models.Category).filter(models.Category.id == category_id).first()
-    if cat:
-        db.delete(cat)
-        db.commit()
-    return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-
-@router.post("/categories/edit/{category_id}")
-async def edit_category(
-    category_id: int,
-    name_en: str = Form(...), name_ar: str = Form(...),
-    slug: str = Form(...),
-    user: models.Admin = Depends(auth.login_required),
-    db: Session = Depends(database.get_db)
-):
-    cat = db.query(models.Category).filter(models.Category.id == category_id).first()
-    if cat:
-        cat.name_en = name_en
-        cat.name_ar = name_ar
-        cat.slug = slug
-        try:
-            db.commit()
-        except:
-            db.rollback()
-            
-    return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
-
-@router.post("/products/edit/{product_id}")
-async def edit_product(
-    product_id: int,
-    request: Request,
-    name_en: str = Form(...), name_ar: str = Form(...),
-    code: str = Form(...), weight: str = Form(...),
-    category_id: int = Form(...),
-    description_en: str = Form(""), description_ar: str = Form(""),
-    image: UploadFile = File(None),
-    user: models.Admin = Depends(auth.login_required),
-    db: Session = Depends(database.get_db)
-):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        return RedirectResponse(url="/admin/dashboard?error=ProductNotFound", status_code=status.HTTP_303_SEE_OTHER)
-    
-    # Update fields
-    product.name_en = name_en
-    product.name_ar = name_ar
-    product.code = code
-    product.weight = weight
-    product.category_id = category_id
-    product.description_en = description_en
-    product.description_ar = description_ar
+# --- Bulk Import / Export ---
+def _import_page(request: Request, user, report=None, error=None, status_code=200):
+    return templates.TemplateResponse("admin/import.html", {
+        "request": request,
+        "user": user,
+        "columns": bulk.COLUMNS,
+        "xlsx": bulk.XLSX_SUPPORTED,
+        "report": report,
+        "error": error,
+        "max_errors": 200,
+    }, status_code=status_code)
 
-    if image and image.filename:
-        # Save new image
-        upload_dir = "app/static/uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        filename = f"{code}_{image.filename}"
-        file_location = f"{upload_dir}/{filename}"
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(image.file, file_object)
-        product.image = f"/static/uploads/{filename}"
+@router.get("/products/import")
+def import_page(request: Request, user: auth.Principal = Depends(auth.login_required)):
+    return _import_page(request, user)
 
+@router.post("/products/import")
+async def import_products(request: Request, file: UploadFile = File(...), user: auth.Principal = Depends(auth.login_required), db: AsyncSession = Depends(database.get_db)):
+    if file.size is not None and file.size > settings.MAX_IMPORT_BYTES:
+        return _import_page(request, user, error=f"The file is larger than {settings.MAX_IMPORT_BYTES / 1024 / 1024:.3g} MB", status_code=413)
     try:
-        db.commit()
-    except Exception:
-        db.rollback()
-    
-    return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
+        fmt = bulk.detect_format(file.filename or "")
+        # Parsing and the batched upserts are blocking work on the sync engine
+        report = await run_in_threadpool(bulk.import_file, database.engine, file.file, fmt, bulk.BATCH_SIZE, settings.MAX_IMPORT_ROWS)
+    except bulk.BulkFormatError as exc:
+        return _import_page(request, user, error=str(exc), status_code=400)
+    if report.inserted or report.updated:
+        await jobs.add(db, "refresh_catalog", unique=True)
+        await db.commit()
+    return _import_page(request, user, report=report)
 
+@router.get("/products/export")
+async def export_products(format: str = "csv", user: auth.Principal = Depends(auth.login_required)):
+    if format == "xlsx" and bulk.XLSX_SUPPORTED:
+        # openpyxl writes the workbook in one go, so spool it to disk first
+        out = tempfile.TemporaryFile()
+        await run_in_threadpool(bulk.export_xlsx, database.engine, out)
+        out.seek(0)
+        return StreamingResponse(
+            bulk.iter_file(out),
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            headers={"Content-Disposition": 'attachment; filename="products.xlsx"'},
+        )
+    return StreamingResponse(
+        bulk.export_csv(database.engine),
+        media_type="text/csv; charset=utf-8",
+        headers={"Content-Disposition": 'attachment; filename="products.csv"'},
+    )
 
 # --- Category CRUD ---
 @router.post("/categories/add")
 async def add_category(
     name_en: str = Form(...), name_ar: str = Form(...),
     slug: str = Form(...),
-    user: models.Admin = Depends(auth.login_required),
-    db: Session = Depends(database.get_db)
+    user: auth.Principal = Depends(auth.login_required),
+    db: AsyncSession = Depends(database.get_db)
 ):
     new_cat = models.Category(
         name_en=name_en, name_ar=name_ar,
@@ -278,17 +308,25 @@ async def add_category(
     )
     try:
         db.add(new_cat)
-        db.commit()
+        await jobs.add(db, "refresh_catalog", unique=True)
+        await db.commit()
     except Exception:
-        db.rollback()
+        await db.rollback()
     return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/categories/delete/{category_id}")
-def delete_category(category_id: int, user: models.Admin = Depends(auth.login_required), db: Session = Depends(database.get_db)):
-    cat = db.query(models.Category).filter(models.Category.id == category_id).first()
+async def delete_category(category_id: int, user: auth.Principal = Depends(auth.login_required), db: AsyncSession = Depends(database.get_db)):
+    cat = await db.get(models.Category, category_id)
     if cat:
-        db.delete(cat)
-        db.commit()
+        # Its products go with it (ON DELETE CASCADE), and so do their images
+        urls = (await db.execute(
+            select(models.Product.image).where(models.Product.category_id == category_id, models.Product.image.isnot(None)).distinct()
+        )).scalars().all()
+        await db.delete(cat)
+        if urls:
+            await jobs.add(db, "release_images", {"urls": urls})
+        await jobs.add(db, "refresh_catalog", unique=True)
+        await db.commit()
     return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
 
 @router.post("/categories/edit/{category_id}")
@@ -296,17 +334,40 @@ async def edit_category(
     category_id: int,
     name_en: str = Form(...), name_ar: str = Form(...),
     slug: str = Form(...),
-    user: models.Admin = Depends(auth.login_required),
-    db: Session = Depends(database.get_db)
+    user: auth.Principal = Depends(auth.login_required),
+    db: AsyncSession = Depends(database.get_db)
 ):
-    cat = db.query(models.Category).filter(models.Category.id == category_id).first()
+    cat = await db.get(models.Category, category_id)
     if cat:
         cat.name_en = name_en
         cat.name_ar = name_ar
         cat.slug = slug
         try:
-            db.commit()
+            await jobs.add(db, "refresh_catalog", unique=True)
+            await db.commit()
         except:
-            db.rollback()
+            await db.rollback()
             
     return RedirectResponse(url="/admin/dashboard", status_code=status.HTTP_303_SEE_OTHER)
+
+# --- Background jobs ---
+@router.get("/api/jobs/{job_id}", response_model=schemas.Job)
+async def job_status(job_id: int, user: auth.Principal = Depends(auth.login_required), db: AsyncSession = Depends(database.get_read_db)):
+    job = await db.get(models.Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.describe(job)
+
+@router.get("/api/jobs", response_model=List[schemas.Job])
+async def job_list(
+    state: Optional[str] = Query(None, alias="status"), kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    user: auth.Principal = Depends(auth.login_required),
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    query = select(models.Job).order_by(models.Job.id.desc()).limit(limit)
+    if state:
+        query = query.where(models.Job.status == state)
+    if kind:
+        query = query.where(models.Job.kind == kind)
+    return [jobs.describe(job) for job in (await db.execute(query)).scalars().all()]
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from .. import database, schemas, pagination, suggest, catalog, cache
+
+# Every endpoint here reads the catalog snapshot
+router = APIRouter(prefix="/api", tags=["api"], dependencies=[Depends(catalog.ready)])
+
+@router.get("/products", response_model=schemas.ProductPage)
+async def list_products(
+    category_id: Optional[int] = None,
+    search: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(pagination.PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(database.get_read_db)
+):
+    try:
+        items, next_cursor = await pagination.product_page(db, category_id, search, cursor, limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"items": items, "next_cursor": next_cursor}
+
+@router.get("/products/{product_id}", response_model=schemas.ProductDetail)
+async def product_detail(product_id: int, request: Request):
+    # What the product modal on /products shows, fetched when a card is opened;
+    # served from the catalog snapshot with an ETag so a revisit is a 304
+    record = catalog.current().products_by_id.get(product_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    category = record.category
+    detail = schemas.ProductDetail(
+        id=record.id, code=record.code, name_en=record.name_en, name_ar=record.name_ar, weight=record.weight,
+        description_en=record.description_en, description_ar=record.description_ar,
+        image=record.image if record.image and record.image != "placeholder.jpg" else None,
+        image_width=record.image_width, image_height=record.image_height,
+        category_id=record.category_id,
+        category_en=category.name_en if category else None,
+        category_ar=category.name_ar if category else None,
+    )
+    return cache.conditional_response(request, detail.model_dump_json().encode("utf-8"), "application/json")
+
+@router.get("/suggest", response_model=List[schemas.Suggestion])
+async def suggest_products(
+    q: str = Query("", max_length=100),
+    limit: int = Query(suggest.LIMIT, ge=1, le=suggest.MAX_LIMIT),
+):
+    # Served from the in-memory prefix index; no database round trip
+    await suggest.ready()
+    return suggest.suggest(q, limit)
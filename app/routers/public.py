@@ -1,53 +1,50 @@
 from fastapi import APIRouter, Request, Depends
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from .. import database, models
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import database, catalog, pagination
+from ..cache import cached_page
+from ..templating import templates, StreamingTemplateResponse
 
 router = APIRouter()
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/")
+@cached_page()
 def home(request: Request):
     return templates.TemplateResponse("home.html", {"request": request, "active": "home"})
 
 @router.get("/about")
+@cached_page()
 def about(request: Request):
     return templates.TemplateResponse("about.html", {"request": request, "active": "about"})
 
 @router.get("/contact")
+@cached_page()
 def contact(request: Request):
     return templates.TemplateResponse("contact.html", {"request": request, "active": "contact"})
 
 @router.get("/products")
-def products(request: Request, category_id: int = None, search: str = None, db: Session = Depends(database.get_db)):
-    # Fetch categories for the filter sidebar
-    categories = db.query(models.Category).all()
+@cached_page(uses_catalog=True)
+async def products(request: Request, category_id: int = None, search: str = None, cursor: str = None, db: AsyncSession = Depends(database.get_read_db)):
+    # Categories for the filter sidebar come from the in-memory snapshot
+    categories = catalog.current().categories
     
-    # Start query
-    query = db.query(models.Product)
+    # One keyset page of matching products, plus per-category counts
+    try:
+        products_list, next_cursor, facets = await pagination.product_page_with_facets(db, category_id, search, cursor)
+    except ValueError:
+        # Stale or tampered cursor: start over from the first page
+        products_list, next_cursor, facets = await pagination.product_page_with_facets(db, category_id, search)
+        cursor = None
     
-    # Apply Filters
-    if category_id:
-        query = query.filter(models.Product.category_id == category_id)
-    
-    if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            or_(
-                models.Product.name_en.ilike(search_term),
-                models.Product.name_ar.ilike(search_term),
-                models.Product.code.ilike(search_term)
-            )
-        )
-    
-    products_list = query.all()
-    
-    return templates.TemplateResponse("products.html", {
+    # Streamed, so the header and sidebar go out before the product grid is rendered
+    return StreamingTemplateResponse("products.html", {
         "request": request, 
         "categories": categories, 
+        "facets": facets,
+        "facet_total": sum(facets.values()),
         "products": products_list,
         "selected_category": category_id,
         "search_term": search,
+        "next_url": str(request.url.include_query_params(cursor=next_cursor)) if next_cursor else None,
+        "first_url": str(request.url.remove_query_params("cursor")) if cursor else None,
         "active": "products"
     })
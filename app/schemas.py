@@ -33,6 +33,8 @@ class ProductCreate(ProductBase):
 
 class Product(ProductBase):
     id: int
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
     created_at: datetime
     
     class Config:
@@ -41,6 +43,72 @@ class Product(ProductBase):
 class ProductWithCategory(Product):
     category: Category
 
+class ProductPage(BaseModel):
+    items: List[ProductWithCategory]
+    next_cursor: Optional[str] = None
+
+class ProductDetail(BaseModel):
+    id: int
+    code: str
+    name_en: str
+    name_ar: str
+    weight: str
+    description_en: Optional[str] = None
+    description_ar: Optional[str] = None
+    image: Optional[str] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
+    category_id: int
+    category_en: Optional[str] = None
+    category_ar: Optional[str] = None
+
+class Suggestion(BaseModel):
+    id: int
+    code: str
+    name_en: str
+    name_ar: str
+    category_id: int
+    category_en: Optional[str] = None
+    category_ar: Optional[str] = None
+
+class AdminProductRow(BaseModel):
+    id: int
+    code: str
+    name_en: str
+    name_ar: str
+    weight: str
+    category_id: int
+    category_name: Optional[str] = None
+    description_en: Optional[str] = None
+    description_ar: Optional[str] = None
+    image: Optional[str] = None
+    thumbnail: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class AdminProductGrid(BaseModel):
+    items: List[AdminProductRow]
+    total: int
+    page: int
+    per_page: int
+    pages: int
+    sort: str
+    order: str
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    result: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 class AdminBase(BaseModel):
     username: str
 
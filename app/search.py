@@ -0,0 +1,274 @@
+import re
+import unicodedata
+from sqlalchemy import bindparam, event, false, literal_column, or_, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+
+# Full-text catalog search backed by an SQLite FTS5 table.
+#
+# The index stores a normalized copy of each product's names and code under
+# the product id as rowid, so a search is an index lookup ranked by bm25
+# instead of a `%term%` scan over the whole products table.
+
+FTS_TABLE = "products_fts"
+STATE_TABLE = "search_index_state"
+
+# Bump when the columns or the normalization change: ensure_index() then
+# drops the table and builds it again.
+FORMAT = 1
+
+# Column weights for bm25 (name_en, name_ar, code). A code hit is the
+# strongest signal that the user found what they typed.
+_WEIGHTS = (2.0, 2.0, 4.0)
+_SCORE = f"bm25({FTS_TABLE}, {', '.join(map(str, _WEIGHTS))})"
+
+# Harakat, Quranic marks, superscript alef and tatweel.
+_TASHKEEL = re.compile("[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+
+_ARABIC_FOLD = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ؤ": "و", "ئ": "ي", "ى": "ي",
+    "ة": "ه",
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+})
+
+_TOKEN = re.compile(r"\w+")
+
+_available = False
+
+
+def normalize(value: str) -> str:
+    """Fold text so that spelling variants of the same word compare equal."""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKC", value)
+    value = _TASHKEEL.sub("", value)
+    return value.translate(_ARABIC_FOLD).casefold()
+
+
+def tokenize(value: str) -> list:
+    return _TOKEN.findall(normalize(value))
+
+
+def _code_terms(code: str) -> str:
+    # Index "CHOC-001" both as its parts and as "choc001" so either spelling matches.
+    tokens = tokenize(code)
+    return " ".join(tokens + ["".join(tokens)]) if len(tokens) > 1 else " ".join(tokens)
+
+
+def match_expression(term: str) -> str:
+    """Build an FTS5 MATCH expression: every token must match as a prefix."""
+    return " ".join(f'"{token}"*' for token in tokenize(term))
+
+
+def ensure_index(engine):
+    """Create the FTS table if needed and rebuild it when it drifts from `products`.
+
+    Drift is a "search" counter in change_versions that moved without the
+    index (migration v0008), a row count that differs, or an older FORMAT.
+    """
+    global _available
+    try:
+        with engine.begin() as conn:
+            state = conn.execute(text(f"SELECT format, version FROM {STATE_TABLE}")).first()
+            outdated = state is None or state.format != FORMAT
+            if outdated:
+                conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "name_en, name_ar, code, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            ))
+            indexed = conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+            total = conn.execute(text("SELECT count(*) FROM products")).scalar()
+            if outdated or state.version != _version(conn) or indexed != total:
+                rebuild(conn)
+    except OperationalError:
+        # SQLite built without FTS5: fall back to the unindexed LIKE search.
+        _available = False
+        return
+    _available = True
+
+
+def rebuild(conn):
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    rows = conn.execute(text("SELECT id, name_en, name_ar, code FROM products"))
+    while True:
+        batch = rows.fetchmany(1000)
+        if not batch:
+            break
+        conn.execute(
+            text(f"INSERT INTO {FTS_TABLE}(rowid, name_en, name_ar, code) VALUES (:id, :name_en, :name_ar, :code)"),
+            [_document(*row) for row in batch],
+        )
+    conn.execute(text(f"DELETE FROM {STATE_TABLE}"))
+    conn.execute(text(f"INSERT INTO {STATE_TABLE}(format, version) VALUES (:format, :version)"),
+                 {"format": FORMAT, "version": _version(conn)})
+
+
+def _version(conn) -> int:
+    return conn.execute(text("SELECT version FROM change_versions WHERE name = 'search'")).scalar() or 0
+
+
+def _mark_synced(conn):
+    # After the index was brought in step with a write, in the write's transaction
+    conn.execute(text(
+        f"UPDATE {STATE_TABLE} SET version = (SELECT version FROM change_versions WHERE name = 'search')"
+    ))
+
+
+def _document(product_id, name_en, name_ar, code):
+    return {
+        "id": product_id,
+        "name_en": normalize(name_en),
+        "name_ar": normalize(name_ar),
+        "code": _code_terms(code),
+    }
+
+
+def index_product(conn, product: models.Product):
+    conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": product.id})
+    conn.execute(
+        text(f"INSERT INTO {FTS_TABLE}(rowid, name_en, name_ar, code) VALUES (:id, :name_en, :name_ar, :code)"),
+        _document(product.id, product.name_en, product.name_ar, product.code),
+    )
+    _mark_synced(conn)
+
+
+def unindex_product(conn, product_id: int):
+    conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {"id": product_id})
+    _mark_synced(conn)
+
+
+def index_codes(conn, codes):
+    """(Re)index the products with these codes; for bulk writes that bypass the ORM."""
+    if not _available or not codes:
+        return
+    rows = conn.execute(
+        text("SELECT id, name_en, name_ar, code FROM products WHERE code IN :codes").bindparams(
+            bindparam("codes", expanding=True)
+        ),
+        {"codes": list(codes)},
+    ).all()
+    if rows:
+        conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), [{"id": row[0]} for row in rows])
+        conn.execute(
+            text(f"INSERT INTO {FTS_TABLE}(rowid, name_en, name_ar, code) VALUES (:id, :name_en, :name_ar, :code)"),
+            [_document(*row) for row in rows],
+        )
+        _mark_synced(conn)
+
+
+def unindex_category(conn, category_id: int):
+    conn.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM products WHERE category_id = :id)"),
+        {"id": category_id},
+    )
+
+
+async def ranked_page(db: AsyncSession, term: str, limit: int, category_id=None, after=None):
+    """Up to `limit` matches for `term` after the (score, id) key `after`, as (score, id) keys, best first.
+
+    The keyset bound and the LIMIT are part of the query, so SQLite keeps
+    only the top `limit` rows instead of handing every match back. Returns
+    None when the FTS index is unavailable.
+    """
+    if not _available:
+        return None
+    match = match_expression(term)
+    if not match:
+        return []
+    source = FTS_TABLE
+    conditions = [f"{FTS_TABLE} MATCH :match"]
+    params = {"match": match, "limit": limit}
+    if category_id:
+        # A join, not `rowid IN (...)`: FTS5 would look every id up in the index
+        source += f" JOIN products ON products.id = {FTS_TABLE}.rowid"
+        conditions.append("products.category_id = :category_id")
+        params["category_id"] = category_id
+    if after is not None:
+        conditions.append(f"({_SCORE}, {FTS_TABLE}.rowid) > (:score, :id)")
+        params["score"], params["id"] = after
+    rows = await db.execute(
+        text(
+            f"SELECT {_SCORE} AS score, {FTS_TABLE}.rowid AS id FROM {source} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY score, id LIMIT :limit"
+        ),
+        params,
+    )
+    return [(score, product_id) for score, product_id in rows]
+
+
+async def category_counts(db: AsyncSession, term: str):
+    """{category_id: number of matches for `term`}, or None when the FTS index is unavailable."""
+    if not _available:
+        return None
+    match = match_expression(term)
+    if not match:
+        return {}
+    rows = await db.execute(
+        text(
+            f"SELECT products.category_id, count(*) FROM {FTS_TABLE} "
+            f"JOIN products ON products.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :match GROUP BY products.category_id"
+        ),
+        {"match": match},
+    )
+    return {category_id: count for category_id, count in rows}
+
+
+def product_filter(term: str):
+    """WHERE clause restricting a products query to matches for `term`."""
+    if not _available:
+        pattern = f"%{term.strip()}%"
+        return or_(models.Product.code.ilike(pattern), models.Product.name_en.ilike(pattern), models.Product.name_ar.like(pattern))
+    match = match_expression(term)
+    if not match:
+        return false()
+    matching = (
+        select(literal_column("rowid"))
+        .select_from(text(FTS_TABLE))
+        .where(text(f"{FTS_TABLE} MATCH :match").bindparams(match=match))
+    )
+    return models.Product.id.in_(matching)
+
+
+def scan(snapshot, term: str):
+    """Fallback for SQLite builds without FTS5: substring match over a catalog snapshot."""
+    needle = normalize(term)
+    return [
+        (0.0, record.id)
+        for record in sorted(snapshot.products_by_id.values(), key=lambda record: record.id)
+        if needle in normalize(record.name_en) or needle in normalize(record.name_ar) or needle in normalize(record.code)
+    ]
+
+
+# Keep the index in step with every ORM write to products.
+@event.listens_for(models.Product, "after_insert")
+@event.listens_for(models.Product, "after_update")
+def _on_product_saved(mapper, connection, target):
+    if _available:
+        index_product(connection, target)
+
+
+@event.listens_for(models.Product, "after_delete")
+def _on_product_deleted(mapper, connection, target):
+    if _available:
+        unindex_product(connection, target.id)
+
+
+# A category's products are removed by ON DELETE CASCADE without the ORM
+# seeing them, so drop their index rows before the category goes, and
+# record the counter once the cascade has bumped it.
+@event.listens_for(models.Category, "before_delete")
+def _on_category_deleting(mapper, connection, target):
+    if _available:
+        unindex_category(connection, target.id)
+
+
+@event.listens_for(models.Category, "after_delete")
+def _on_category_deleted(mapper, connection, target):
+    if _available:
+        _mark_synced(connection)
@@ -0,0 +1,112 @@
+import os
+
+# Runtime settings.
+#
+# Everything deployment-specific comes from VINES_* environment variables so
+# the same code runs on a laptop, in the benchmarks and in production. Values
+# are read once at import; restart the process to change them.
+
+
+def _env(name: str, default, cast=str):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return cast(value)
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Deployment: "production" turns off development conveniences such as
+# reloading templates that changed on disk
+ENV = _env("VINES_ENV", "development")
+PRODUCTION = ENV == "production"
+
+# Database
+DATABASE_URL = _env("VINES_DATABASE_URL", "sqlite:///./vines.db")
+# Connections in the read-only pool used by the public pages and the API
+DB_READ_POOL_SIZE = _env("VINES_DB_READ_POOL_SIZE", 8, int)
+# Seconds a request waits for a pooled connection (or the single writer)
+DB_POOL_TIMEOUT = _env("VINES_DB_POOL_TIMEOUT", 30.0, float)
+
+# SQLite engine profile, applied to every new connection
+SQLITE_JOURNAL_MODE = _env("VINES_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = _env("VINES_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = _env("VINES_SQLITE_MMAP_SIZE", 256 * 1024 * 1024, int)
+# Negative values are KiB, as in PRAGMA cache_size (-65536 = 64 MiB per connection)
+SQLITE_CACHE_SIZE = _env("VINES_SQLITE_CACHE_SIZE", -65536, int)
+SQLITE_BUSY_TIMEOUT_MS = _env("VINES_SQLITE_BUSY_TIMEOUT_MS", 5000, int)
+
+# Admin authentication
+# Seconds a token's admin is trusted without re-reading the admins table
+PRINCIPAL_CACHE_TTL = _env("VINES_PRINCIPAL_CACHE_TTL", 60.0, float)
+PRINCIPAL_CACHE_ENTRIES = _env("VINES_PRINCIPAL_CACHE_ENTRIES", 1024, int)
+# Threads hashing passwords, and how many checks may queue before logins are refused
+PASSWORD_HASH_WORKERS = _env("VINES_PASSWORD_HASH_WORKERS", 2, int)
+PASSWORD_HASH_MAX_PENDING = _env("VINES_PASSWORD_HASH_MAX_PENDING", 32, int)
+
+# Request instrumentation
+SLOW_REQUEST_MS = _env("VINES_SLOW_REQUEST_MS", 250.0, float)
+# The same statement this many times in one request is reported as a likely N+1
+REPEATED_QUERY_THRESHOLD = _env("VINES_REPEATED_QUERY_THRESHOLD", 5, int)
+
+# Public page cache
+PAGE_CACHE_ENTRIES = _env("VINES_PAGE_CACHE_ENTRIES", 512, int)
+PAGE_CACHE_BYTES = _env("VINES_PAGE_CACHE_BYTES", 32 * 1024 * 1024, int)
+
+# Response compression (gzip, or brotli when the client accepts it)
+COMPRESS_MIN_BYTES = _env("VINES_COMPRESS_MIN_BYTES", 1024, int)
+GZIP_LEVEL = _env("VINES_GZIP_LEVEL", 6, int)
+# 0-11; dynamic pages are compressed per request, so stay well below the maximum
+BROTLI_QUALITY = _env("VINES_BROTLI_QUALITY", 5, int)
+
+# Uploads and image processing
+MAX_UPLOAD_BYTES = _env("VINES_MAX_UPLOAD_BYTES", 10 * 1024 * 1024, int)
+IMAGE_WORKERS = _env("VINES_IMAGE_WORKERS", 2, int)
+# Product imports through the admin (python -m app.bulk has no limits)
+MAX_IMPORT_BYTES = _env("VINES_MAX_IMPORT_BYTES", 20 * 1024 * 1024, int)
+MAX_IMPORT_ROWS = _env("VINES_MAX_IMPORT_ROWS", 100000, int)
+
+# Templates
+TEMPLATE_AUTO_RELOAD = _env("VINES_TEMPLATE_AUTO_RELOAD", not PRODUCTION, _flag)
+# Compiled template bytecode, shared by every worker (python -m app.templating compile)
+TEMPLATE_CACHE_DIR = _env("VINES_TEMPLATE_CACHE_DIR", ".cache/templates")
+
+# Startup
+# Load the catalog snapshot and templates after the worker starts serving
+# instead of before; off, startup waits for them
+WARM_UP_IN_BACKGROUND = _env("VINES_WARM_UP_IN_BACKGROUND", True, _flag)
+
+# Languages (app/i18n.py)
+# Used for pages without an /en or /ar prefix when the visitor has not picked one
+DEFAULT_LANGUAGE = _env("VINES_DEFAULT_LANGUAGE", "en")
+
+# Metrics (/metrics)
+# Each worker writes its values here for the others' scrapes to sum
+METRICS_DIR = _env("VINES_METRICS_DIR", ".cache/metrics")
+METRICS_FLUSH_SECONDS = _env("VINES_METRICS_FLUSH_SECONDS", 1.0, float)
+# When set, /metrics requires "Authorization: Bearer <token>"
+METRICS_TOKEN = _env("VINES_METRICS_TOKEN", None)
+
+# Several workers on one database (app/coordination.py)
+# Lock files serializing startup work between workers
+LOCK_DIR = _env("VINES_LOCK_DIR", ".cache/locks")
+# How often each worker checks for writes made by the others
+INVALIDATION_POLL_MS = _env("VINES_INVALIDATION_POLL_MS", 25.0, float)
+
+# Background jobs (app/jobs.py)
+# Jobs run at once by each app process
+JOB_WORKERS = _env("VINES_JOB_WORKERS", 2, int)
+# How often idle workers look for jobs queued by other processes or due for a retry
+JOB_POLL_SECONDS = _env("VINES_JOB_POLL_SECONDS", 1.0, float)
+JOB_MAX_ATTEMPTS = _env("VINES_JOB_MAX_ATTEMPTS", 5, int)
+# First retry delay; doubles with every failed attempt
+JOB_BACKOFF_SECONDS = _env("VINES_JOB_BACKOFF_SECONDS", 2.0, float)
+# A job running longer than this is assumed lost with its process and run again
+JOB_LEASE_SECONDS = _env("VINES_JOB_LEASE_SECONDS", 600.0, float)
+# Finished jobs are kept this long for the status endpoint
+JOB_KEEP_SECONDS = _env("VINES_JOB_KEEP_SECONDS", 7 * 24 * 3600.0, float)
+# Unreferenced files in app/static/uploads are removed this often, once older than the grace period
+UPLOAD_SWEEP_SECONDS = _env("VINES_UPLOAD_SWEEP_SECONDS", 3600.0, float)
+UPLOAD_SWEEP_GRACE_SECONDS = _env("VINES_UPLOAD_SWEEP_GRACE_SECONDS", 3600.0, float)
@@ -1,33 +1,15 @@
 document.addEventListener('DOMContentLoaded', () => {
     const langToggleBtn = document.getElementById('lang-toggle');
     const htmlElement = document.documentElement;
-    const bodyElement = document.body;
-
-    // Check saved preference
-    const currentLang = localStorage.getItem('vines_lang') || 'en';
-    setLanguage(currentLang);
 
+    // Pages are rendered in one language by the server; the switch links to the
+    // other language's page and remembers the choice for unprefixed URLs.
     if (langToggleBtn) {
         langToggleBtn.addEventListener('click', () => {
-            const newLang = htmlElement.lang === 'en' ? 'ar' : 'en';
-            setLanguage(newLang);
+            document.cookie = `vines_lang=${langToggleBtn.dataset.lang}; path=/; max-age=31536000; samesite=lax`;
         });
     }
 
-    function setLanguage(lang) {
-        htmlElement.lang = lang;
-        if (lang === 'ar') {
-            htmlElement.dir = 'rtl';
-            bodyElement.classList.add('rtl');
-            if (langToggleBtn) langToggleBtn.textContent = 'EN';
-        } else {
-            htmlElement.dir = 'ltr';
-            bodyElement.classList.remove('rtl');
-            if (langToggleBtn) langToggleBtn.textContent = 'AR';
-        }
-        localStorage.setItem('vines_lang', lang);
-    }
-
     /* Hero Slider Logic */
     const slides = document.querySelectorAll('.slide');
     const dots = document.querySelectorAll('.slide-dot');
@@ -168,17 +150,14 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('modal-image').src = data.image;
         document.getElementById('modal-code-badge').textContent = data.code;
 
-        document.getElementById('modal-title-en').textContent = data.name_en;
-        document.getElementById('modal-title-ar').textContent = data.name_ar;
-
-        document.getElementById('modal-category-en').textContent = data.category_en;
-        document.getElementById('modal-category-ar').textContent = data.category_ar;
+        const lang = htmlElement.lang;
+        document.getElementById('modal-title').textContent = data[`name_${lang}`];
+        document.getElementById('modal-category').textContent = data[`category_${lang}`];
 
         document.getElementById('modal-code').textContent = data.code;
         document.getElementById('modal-weight').textContent = data.weight;
 
-        document.getElementById('modal-desc-en').textContent = data.description_en;
-        document.getElementById('modal-desc-ar').textContent = data.description_ar;
+        document.getElementById('modal-desc').textContent = data[`description_${lang}`];
 
         // Show Modal
         modal.classList.remove('hidden');
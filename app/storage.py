@@ -0,0 +1,172 @@
+import hashlib
+import os
+import re
+import time
+import uuid
+from typing import NamedTuple
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, settings
+
+# Content-addressed storage for uploaded images.
+#
+# Uploads are streamed to a temp file in fixed-size chunks with async I/O,
+# hashed and size-checked as they arrive, then moved to
+# uploads/<aa>/<bb>/<sha256>.<ext>. Identical images therefore land on the
+# same path and are stored once, whatever they were called on the admin's
+# disk. A file is deleted again once no product points at it, and a
+# periodic sweep (app/tasks.py) removes anything else nothing points at.
+
+UPLOAD_DIR = "app/static/uploads"
+UPLOAD_URL = "/static/uploads"
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = settings.MAX_UPLOAD_BYTES
+
+# <stem>-<width>.<ext>, as written by app/images.py
+_VARIANT = re.compile(r"(.+)-\d+\.(?:webp|png|jpg)")
+
+# aiofiles.os has no utime; this runs it on the same executor as the rest
+_utime = aiofiles.os.wrap(os.utime)
+
+# Leading bytes -> extension. The client's filename and content type are not trusted.
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+
+class UploadRejected(ValueError):
+    pass
+
+
+class StoredUpload(NamedTuple):
+    url: str
+    sha256: str
+    size: int
+    created: bool  # False when an identical file was already stored
+
+
+def sniff(head: bytes) -> str:
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    raise UploadRejected("Unsupported image type")
+
+
+def _relative_path(digest: str, ext: str) -> str:
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+
+async def save_upload(upload: UploadFile) -> StoredUpload:
+    """Stream `upload` into content-addressed storage; raises UploadRejected."""
+    tmp_dir = os.path.join(UPLOAD_DIR, ".tmp")
+    await aiofiles.os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    try:
+        async with aiofiles.open(tmp_path, "wb") as out:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if ext is None:
+                    ext = sniff(chunk)
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise UploadRejected("Image is too large")
+                digest.update(chunk)
+                await out.write(chunk)
+        if ext is None:
+            raise UploadRejected("Empty upload")
+
+        relative = _relative_path(digest.hexdigest(), ext)
+        final_path = os.path.join(UPLOAD_DIR, relative)
+        created = not await aiofiles.os.path.exists(final_path)
+        if created:
+            await aiofiles.os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            await aiofiles.os.replace(tmp_path, final_path)
+        else:
+            # Fresh again, so sweep() leaves it alone until the product is saved
+            await _utime(final_path)
+    finally:
+        if await aiofiles.os.path.exists(tmp_path):
+            await aiofiles.os.remove(tmp_path)
+
+    return StoredUpload(f"{UPLOAD_URL}/{relative}", digest.hexdigest(), size, created)
+
+
+async def is_referenced(db: AsyncSession, url: str) -> bool:
+    found = await db.execute(select(models.Product.id).where(models.Product.image == url).limit(1))
+    return found.first() is not None
+
+
+async def release(db: AsyncSession, url: str):
+    """Delete a stored image and its resized variants if no product uses it any more.
+
+    Like sweep(), leaves files alone that were stored within UPLOAD_SWEEP_GRACE_SECONDS.
+    """
+    if not url or not url.startswith(UPLOAD_URL + "/") or await is_referenced(db, url):
+        return
+    path = os.path.join(UPLOAD_DIR, url[len(UPLOAD_URL) + 1:])
+    stem, _ = os.path.splitext(os.path.basename(path))
+    variant = re.compile(re.escape(stem) + r"-\d+\.(?:webp|png|jpg)")
+    directory = os.path.dirname(path)
+    if not await aiofiles.os.path.isdir(directory):
+        return
+    try:
+        modified = await aiofiles.os.path.getmtime(path)
+    except FileNotFoundError:
+        modified = 0.0  # only variants left
+    if modified >= time.time() - settings.UPLOAD_SWEEP_GRACE_SECONDS:
+        # Uploaded (or re-uploaded, see save_upload) within the grace period:
+        # the product using it may not be committed yet. sweep() gets it later.
+        return
+    for name in await aiofiles.os.listdir(directory):
+        if name == os.path.basename(path) or variant.fullmatch(name):
+            try:
+                await aiofiles.os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def sweep(referenced, older_than: float) -> list:
+    """Delete files under UPLOAD_DIR that none of the `referenced` URLs use.
+
+    Originals and their variants are kept while a URL points at them; files
+    modified at or after `older_than` (an epoch time) are left alone, as an
+    upload may not be committed yet. Returns the removed paths, relative to
+    UPLOAD_DIR. Blocking; run it in a thread.
+    """
+    keep = {url[len(UPLOAD_URL) + 1:] for url in referenced if url and url.startswith(UPLOAD_URL + "/")}
+    stems = {os.path.splitext(relative)[0] for relative in keep}
+    removed = []
+    for root, _, files in os.walk(UPLOAD_DIR, topdown=False):
+        for name in files:
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, UPLOAD_DIR).replace(os.sep, "/")
+            variant = _VARIANT.fullmatch(relative)
+            if relative in keep or (variant and variant.group(1) in stems):
+                continue
+            try:
+                if os.path.getmtime(path) >= older_than:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed.append(relative)
+        if root != UPLOAD_DIR:
+            try:
+                os.rmdir(root)  # only succeeds once the directory is empty
+            except OSError:
+                pass
+    return removed
@@ -0,0 +1,197 @@
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from . import catalog, search
+
+# Typeahead suggestions from an in-memory prefix index.
+#
+# Every product contributes a few normalized keys (its code, its full names
+# and each name from its second word on) to one of three sorted arrays, so a
+# lookup is a bisect to the first key starting with what the visitor typed
+# and a short walk from there. The arrays are tiered by how good a hit is:
+# codes first, then names that start with the term, then names containing
+# it as a later word. Admin writes publish a new catalog snapshot; only the
+# products that changed are moved in the index, on a copy that is swapped
+# in whole, so lookups never see a half-updated array.
+
+LIMIT = 8
+MAX_LIMIT = 20
+# Past this many changed products a full rebuild is cheaper than insort
+REBUILD_THRESHOLD = 2000
+
+CODE, NAME, WORD = range(3)
+
+
+class _Tier:
+    """Sorted keys with the product id of each key in a parallel list."""
+    __slots__ = ("keys", "ids")
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.keys = [key for key, _ in pairs]
+        self.ids = [product_id for _, product_id in pairs]
+
+    def copy(self):
+        tier = _Tier()
+        tier.keys = self.keys[:]
+        tier.ids = self.ids[:]
+        return tier
+
+    def add(self, key: str, product_id: int):
+        position = bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.ids.insert(position, product_id)
+
+    def remove(self, key: str, product_id: int):
+        start, end = bisect_left(self.keys, key), bisect_right(self.keys, key)
+        try:
+            position = self.ids.index(product_id, start, end)
+        except ValueError:
+            return
+        del self.keys[position]
+        del self.ids[position]
+
+    def matches(self, prefix: str):
+        """Product ids whose key starts with `prefix`, in key order."""
+        keys, ids = self.keys, self.ids
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and keys[position].startswith(prefix):
+            yield ids[position]
+            position += 1
+
+
+def _key(value: str) -> str:
+    return " ".join(search.tokenize(value))
+
+
+def _entries(record) -> list:
+    """(tier, key) pairs for one product."""
+    entries = []
+    code = search.tokenize(record.code)
+    if code:
+        entries.append((CODE, " ".join(code)))
+        if len(code) > 1:
+            entries.append((CODE, "".join(code)))
+    for name in (record.name_en, record.name_ar):
+        words = search.tokenize(name)
+        if words:
+            entries.append((NAME, " ".join(words)))
+            entries.extend((WORD, " ".join(words[start:])) for start in range(1, len(words)))
+    return entries
+
+
+def _signature(record):
+    return (record.name_en, record.name_ar, record.code)
+
+
+class PrefixIndex:
+    __slots__ = ("version", "tiers", "entries")
+
+    def __init__(self, version: int, tiers, entries: dict):
+        self.version = version
+        self.tiers = tiers
+        self.entries = entries  # product id -> (signature, [(tier, key)])
+
+    @classmethod
+    def build(cls, snapshot: catalog.CatalogSnapshot) -> "PrefixIndex":
+        pairs = ([], [], [])
+        entries = {}
+        for record in snapshot.products_by_id.values():
+            product_entries = _entries(record)
+            entries[record.id] = (_signature(record), product_entries)
+            for tier, key in product_entries:
+                pairs[tier].append((key, record.id))
+        return cls(snapshot.version, tuple(_Tier(tier) for tier in pairs), entries)
+
+    def updated(self, snapshot: catalog.CatalogSnapshot) -> "PrefixIndex":
+        """The index for `snapshot`, moving only the products whose names or code changed."""
+        products = snapshot.products_by_id
+        removed = [product_id for product_id in self.entries if product_id not in products]
+        changed = [
+            record for record in products.values()
+            if record.id not in self.entries or self.entries[record.id][0] != _signature(record)
+        ]
+        if not removed and not changed:
+            return PrefixIndex(snapshot.version, self.tiers, self.entries)
+        if len(removed) + len(changed) > REBUILD_THRESHOLD:
+            return PrefixIndex.build(snapshot)
+
+        tiers = tuple(tier.copy() for tier in self.tiers)
+        entries = dict(self.entries)
+        for product_id in removed + [record.id for record in changed if record.id in entries]:
+            for tier, key in entries.pop(product_id)[1]:
+                tiers[tier].remove(key, product_id)
+        for record in changed:
+            product_entries = _entries(record)
+            entries[record.id] = (_signature(record), product_entries)
+            for tier, key in product_entries:
+                tiers[tier].add(key, record.id)
+        return PrefixIndex(snapshot.version, tiers, entries)
+
+    def lookup(self, term: str, limit: int = LIMIT) -> list:
+        """Up to `limit` product ids for `term`, best tier first."""
+        prefix = _key(term)
+        found = []
+        if not prefix:
+            return found
+        seen = set()
+        for tier in self.tiers:
+            for product_id in tier.matches(prefix):
+                if product_id not in seen:
+                    seen.add(product_id)
+                    found.append(product_id)
+                    if len(found) >= limit:
+                        return found
+        return found
+
+
+_lock = threading.Lock()
+_index: Optional[PrefixIndex] = None
+
+
+@catalog.on_refresh
+def _on_refresh(snapshot: catalog.CatalogSnapshot):
+    global _index
+    with _lock:
+        if _index is None:
+            _index = PrefixIndex.build(snapshot)
+        elif _index.version < snapshot.version:
+            _index = _index.updated(snapshot)
+
+
+def current() -> PrefixIndex:
+    index = _index
+    if index is None:
+        # First lookup in this process: the snapshot may predate this module
+        _on_refresh(catalog.current())
+        index = _index
+    return index
+
+
+async def ready():
+    """catalog.ready() for the index: building it from the first snapshot takes a while."""
+    if _index is None:
+        await run_in_threadpool(current)
+
+
+def suggest(term: str, limit: int = LIMIT) -> list:
+    """Top matches for `term` as dicts with their category labels."""
+    snapshot = catalog.current()
+    products = snapshot.products_by_id
+    suggestions = []
+    for product_id in current().lookup(term, limit):
+        record = products.get(product_id)
+        if record is None:
+            continue  # deleted since the index was built
+        category = record.category
+        suggestions.append({
+            "id": record.id,
+            "code": record.code,
+            "name_en": record.name_en,
+            "name_ar": record.name_ar,
+            "category_id": record.category_id,
+            "category_en": category.name_en if category else None,
+            "category_ar": category.name_ar if category else None,
+        })
+    return suggestions
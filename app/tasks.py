@@ -0,0 +1,56 @@
+import time
+from sqlalchemy import select, union, update
+from starlette.concurrency import run_in_threadpool
+from . import catalog, database, images, jobs, models, settings, storage
+
+# Background work queued by the admin (see app/jobs.py).
+#
+# process_image builds the resized variants of a new upload and fills in
+# the product's dimensions; until it has, pages show the original image.
+# release_images deletes images that a deleted or edited product no longer
+# uses. refresh_catalog rebuilds the snapshot after a write (every other
+# worker does the same through app/coordination.py). sweep_uploads removes
+# whatever else in app/static/uploads nothing points at.
+
+
+@jobs.handler("process_image")
+async def process_image(payload: dict):
+    url = payload["url"]
+    info = await images.process(url)
+    if info is None:
+        return "not a readable image"  # retrying will not change that
+    async with database.AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.Product)
+            .where(models.Product.image == url, models.Product.image_width.is_(None))
+            .values(image_width=info.width, image_height=info.height)
+        )
+        await db.commit()
+    return f"{info.width}x{info.height}"
+
+
+@jobs.handler("release_images")
+async def release_images(payload: dict):
+    async with database.ReadSessionLocal() as db:
+        for url in payload["urls"]:
+            await storage.release(db, url)
+
+
+@jobs.handler("refresh_catalog")
+async def refresh_catalog(payload: dict):
+    snapshot = await catalog.reload()
+    return f"catalog version {snapshot.version}"
+
+
+@jobs.handler("sweep_uploads", max_attempts=1)
+async def sweep_uploads(payload: dict):
+    started = time.time()
+    async with database.ReadSessionLocal() as db:
+        referenced = (await db.execute(union(
+            select(models.Product.image).where(models.Product.image.isnot(None)),
+            select(models.Category.image).where(models.Category.image.isnot(None)),
+        ))).scalars().all()
+    removed = await run_in_threadpool(storage.sweep, referenced, started - settings.UPLOAD_SWEEP_GRACE_SECONDS)
+    return f"{len(removed)} removed"
+
+jobs.every("sweep_uploads", settings.UPLOAD_SWEEP_SECONDS)
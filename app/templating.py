@@ -0,0 +1,115 @@
+import os
+import sys
+import time
+import jinja2
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from . import assets, i18n, images, instrumentation, settings
+
+# The one Jinja environment shared by main.py and every router.
+#
+# Templates are compiled once per process instead of once per
+# Jinja2Templates instance, and the compiled code is kept in a bytecode
+# cache on disk (VINES_TEMPLATE_CACHE_DIR), so a fresh worker loads it
+# instead of parsing the sources again. `python -m app.templating compile`
+# fills that cache ahead of a deploy; startup then loads every template
+# into memory before the first request. In production (VINES_ENV=production)
+# templates are not checked for changes on disk.
+
+TEMPLATE_DIR = "app/templates"
+# Rendered text is sent in pieces of about this many characters
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def _bytecode_cache() -> jinja2.BytecodeCache:
+    os.makedirs(settings.TEMPLATE_CACHE_DIR, exist_ok=True)
+    return jinja2.FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR)
+
+
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    auto_reload=settings.TEMPLATE_AUTO_RELOAD,
+    bytecode_cache=_bytecode_cache(),
+)
+
+# Every page knows the language it is rendered in (lang, text_dir, lang_url)
+templates = Jinja2Templates(env=env, context_processors=[i18n.template_context])
+instrumentation.instrument_templates(templates)
+images.register_template_helpers(templates)
+assets.register_template_helpers(templates)
+
+
+def _chunked(pieces, size: int):
+    # Jinja yields many tiny strings; batch them so each write is worth sending
+    buffer, buffered = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield "".join(buffer).encode("utf-8")
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+class StreamingTemplateResponse(StreamingResponse):
+    """Like templates.TemplateResponse, but sends the page while Jinja is still rendering it.
+
+    The head of the page goes out before the product loop has finished.
+    The template is loaded up front, so a missing or broken template still
+    fails before any bytes are sent; an error during rendering cuts the
+    response short instead of turning it into a 500 page.
+    """
+
+    def __init__(self, name: str, context: dict, status_code: int = 200, headers=None,
+                 chunk_size: int = STREAM_CHUNK_SIZE):
+        if "request" not in context:
+            raise ValueError('context must include a "request" key')
+        self.template = env.get_template(name)
+        for processor in templates.context_processors:
+            context = {**context, **processor(context["request"])}
+        self.context = context
+        super().__init__(
+            _chunked(self.template.generate(context), chunk_size),
+            status_code=status_code, headers=headers, media_type="text/html; charset=utf-8",
+        )
+
+
+def precompile() -> list:
+    """Load every template into the environment (compiling any the cache lacks); returns their names."""
+    names = [name for name in env.list_templates() if name.endswith(".html")]
+    for name in names:
+        env.get_template(name)
+    return names
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app.templating", description="Template bytecode cache")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("compile", help="compile every template into the bytecode cache")
+    commands.add_parser("clear", help="empty the bytecode cache")
+    args = parser.parse_args(argv)
+
+    if args.command == "clear":
+        env.bytecode_cache.clear()
+        print(f"Cleared {settings.TEMPLATE_CACHE_DIR}")
+        return 0
+
+    # Start empty so templates that were renamed or deleted leave nothing behind
+    env.bytecode_cache.clear()
+    started = time.perf_counter()
+    try:
+        names = precompile()
+    except jinja2.TemplateSyntaxError as exc:
+        print(f"{exc.filename}:{exc.lineno}: {exc.message}", file=sys.stderr)
+        return 1
+    print(f"Compiled {len(names)} templates into {settings.TEMPLATE_CACHE_DIR} "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import contextlib
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+# Shared plumbing for the benchmarks: a throwaway working directory (so the
+# relative ./vines.db is fresh and the real one is never touched) and a
+# uvicorn server running the app from it. The workspace mirrors app/ with
+# symlinks except for app/static/uploads, which starts empty, so images
+# made by a benchmark never land in the repository.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _mirror(source: str, target: str, private: tuple):
+    # Symlink every entry of `source` into `target`, recreating the
+    # directories on the `private` paths instead of linking them
+    os.makedirs(target)
+    for name in os.listdir(source):
+        if name == "__pycache__":
+            continue
+        inner = tuple(p[1:] for p in private if p and p[0] == name)
+        if inner == ((),):
+            os.makedirs(os.path.join(target, name))
+        elif inner:
+            _mirror(os.path.join(source, name), os.path.join(target, name), inner)
+        else:
+            os.symlink(os.path.join(source, name), os.path.join(target, name))
+
+
+@contextlib.contextmanager
+def workspace():
+    """chdir into a temp dir mirroring app/ and main.py; yields its path."""
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="vines-bench-") as path:
+        _mirror(os.path.join(REPO_ROOT, "app"), os.path.join(path, "app"), (("static", "uploads"),))
+        os.symlink(os.path.join(REPO_ROOT, "main.py"), os.path.join(path, "main.py"))
+        if REPO_ROOT not in sys.path:
+            sys.path.insert(0, REPO_ROOT)
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            os.chdir(previous)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def server(workers: int = 1, env=None):
+    """Run `uvicorn main:app` from the current directory; yields its base URL."""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        env={**os.environ, **(env or {})},
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                urllib.request.urlopen(base_url + "/about", timeout=1).read()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def summarize(latencies, elapsed: float) -> dict:
+    """Throughput and latency percentiles (milliseconds) for a list of seconds."""
+    if not latencies:
+        return {"requests": 0}
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+    return {
+        "requests": len(ordered),
+        "rps": round(len(ordered) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
@@ -0,0 +1,113 @@
+"""Tail latency of public pages while admins are writing.
+
+    python -m benchmarks.concurrency [--seconds 10] [--readers 32] [--admins 2] [--products 2000]
+
+Starts uvicorn on a throwaway database, then runs public readers (home,
+listing, category, search, JSON API) concurrently with admins who keep
+logging in and editing products. Any handler that blocks the event loop
+shows up directly in the readers' p99. Prints a JSON report; requires httpx.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from benchmarks.common import workspace, server, summarize
+
+ADMIN_USER = ("owner", "DesignMaster2025")
+
+
+def prepare(products: int):
+    from app import database, models, auth, migrations
+    import seed
+
+    migrations.upgrade(database.engine)
+    seed.seed_data()
+    db = database.SessionLocal()
+    try:
+        auth.create_super_admin_if_not_exists(db)
+        category_ids = [c.id for c in db.query(models.Category).all()]
+        db.add_all(
+            models.Product(
+                category_id=random.choice(category_ids),
+                name_en=f"Bench Product {i}", name_ar=f"منتج تجريبي {i}",
+                code=f"BENCH-{i:06d}", weight="1 KG",
+                description_en="Benchmark item.", description_ar="منتج للاختبار.",
+            )
+            for i in range(products)
+        )
+        db.commit()
+        bench = db.query(models.Product.id, models.Product.code).filter(models.Product.code.like("BENCH-%")).all()
+        return category_ids, [tuple(row) for row in bench]
+    finally:
+        db.close()
+
+
+async def reader(client, category_ids, stop, latencies, errors):
+    paths = ["/", "/products", "/api/products", "/products?search=bench", "/api/products?search=choc"]
+    while time.monotonic() < stop:
+        path = random.choice(paths + [f"/products?category_id={random.choice(category_ids)}"])
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            response.raise_for_status()
+        except httpx.HTTPError:
+            errors.append(path)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def admin(client, category_ids, products, stop, latencies):
+    while time.monotonic() < stop:
+        started = time.perf_counter()
+        await client.post("/admin/login", data={"username": ADMIN_USER[0], "password": ADMIN_USER[1]})
+        product_id, code = random.choice(products)
+        await client.post(f"/admin/products/edit/{product_id}", data={
+            "name_en": f"{code} (edited)", "name_ar": f"منتج تجريبي {product_id}",
+            "code": code, "weight": "1 KG", "category_id": random.choice(category_ids),
+        })
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(base_url, category_ids, products, args):
+    read_latencies, admin_latencies, errors = [], [], []
+    limits = httpx.Limits(max_connections=args.readers + args.admins)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as public_client:
+        admin_clients = [httpx.AsyncClient(base_url=base_url, timeout=60) for _ in range(args.admins)]
+        started = time.monotonic()
+        stop = started + args.seconds
+        await asyncio.gather(
+            *(reader(public_client, category_ids, stop, read_latencies, errors) for _ in range(args.readers)),
+            *(admin(c, category_ids, products, stop, admin_latencies) for c in admin_clients),
+        )
+        elapsed = time.monotonic() - started
+        for c in admin_clients:
+            await c.aclose()
+    return {
+        "public": summarize(read_latencies, elapsed),
+        "admin_login_and_edit": summarize(admin_latencies, elapsed),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=32)
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--products", type=int, default=2000)
+    args = parser.parse_args()
+
+    with workspace():
+        category_ids, products = prepare(args.products)
+        with server() as base_url:
+            report = asyncio.run(run(base_url, category_ids, products, args))
+    report["config"] = vars(args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Throughput and latency of every public and admin route on a large catalog.
+
+    python -m benchmarks.routes [--products 10000] [--seconds 3] [--concurrency 8]
+                                [--only products] [--cold] [--output report.json]
+    python -m benchmarks.routes --compare before.json after.json
+
+Seeds a throwaway database with the synthetic catalog from seed.py, starts
+uvicorn on it and hammers one route at a time with `--concurrency` clients
+for `--seconds`. Admin routes run logged in as the super admin; write
+routes use fresh rows so they never collide. --cold turns the public page
+cache off. The JSON report carries the git commit, so two reports can be
+diffed with --compare. Requires httpx.
+"""
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.common import REPO_ROOT, workspace, server, summarize
+
+ADMIN_USER = ("owner", "DesignMaster2025")
+IMPORT_CSV = "code,name_en,name_ar,weight,category\n" + "".join(
+    f"BENCH-IMPORT-{n},Imported {n},منتج مستورد {n},1 KG,synthetic-1\n" for n in range(50)
+)
+
+
+def prepare(products: int, categories: int, image_count: int):
+    from app import database, migrations, auth
+    import seed
+
+    migrations.upgrade(database.engine)
+    seed.seed_data()
+    seed.seed_synthetic(products, categories, image_count)
+    db = database.SessionLocal()
+    try:
+        auth.create_super_admin_if_not_exists(db)
+    finally:
+        db.close()
+
+
+def _db():
+    return sqlite3.connect("vines.db")
+
+
+class Fixtures:
+    """Ids and values the routes need, read straight from the workspace database."""
+
+    def __init__(self):
+        with _db() as conn:
+            self.category_ids = [row[0] for row in conn.execute("SELECT id FROM categories WHERE slug LIKE 'synthetic-%'")]
+            self.product_ids = [row[0] for row in conn.execute("SELECT id FROM products WHERE code LIKE 'SYN-%' LIMIT 1000")]
+        self.counter = itertools.count(1)
+        self.cursor = None
+
+    def unique(self) -> int:
+        return next(self.counter)
+
+    def created(self, table: str, column: str, prefix: str):
+        with _db() as conn:
+            return [row[0] for row in conn.execute(f"SELECT id FROM {table} WHERE {column} LIKE ?", (prefix + "%",))]
+
+
+def _edit_product_form(fx, product_id):
+    return {
+        "name_en": f"Edited {product_id}", "name_ar": f"معدل {product_id}", "code": f"SYN-{product_id:07d}-E",
+        "weight": "1 KG", "category_id": fx.category_ids[product_id % len(fx.category_ids)],
+    }
+
+
+# (name, admin?, kind, request builder). A builder returns (method, url, kwargs).
+# "pool" routes consume ids created by the route before them.
+ROUTES = [
+    ("GET /", False, "read", lambda fx: ("GET", "/", {})),
+    ("GET /about", False, "read", lambda fx: ("GET", "/about", {})),
+    ("GET /contact", False, "read", lambda fx: ("GET", "/contact", {})),
+    ("GET /products", False, "read", lambda fx: ("GET", "/products", {})),
+    ("GET /ar/products", False, "read", lambda fx: ("GET", "/ar/products", {})),
+    ("GET /products?cursor", False, "read", lambda fx: ("GET", "/products", {"params": {"cursor": fx.cursor}})),
+    ("GET /products?category_id", False, "read",
+     lambda fx: ("GET", "/products", {"params": {"category_id": fx.category_ids[fx.unique() % len(fx.category_ids)]}})),
+    ("GET /products?search", False, "read", lambda fx: ("GET", "/products", {"params": {"search": "chocolate"}})),
+    ("GET /products?search (arabic)", False, "read", lambda fx: ("GET", "/products", {"params": {"search": "قهوة"}})),
+    ("GET /api/products", False, "read", lambda fx: ("GET", "/api/products", {})),
+    ("GET /api/products?search", False, "read", lambda fx: ("GET", "/api/products", {"params": {"search": "cocoa"}})),
+    ("GET /api/products/{id}", False, "read",
+     lambda fx: ("GET", f"/api/products/{fx.product_ids[fx.unique() % len(fx.product_ids)]}", {})),
+    ("GET /api/suggest", False, "read",
+     lambda fx: ("GET", "/api/suggest", {"params": {"q": ("ch", "coc", "prem", "syn-00", "قه")[fx.unique() % 5]}})),
+    ("GET /admin/login", False, "read", lambda fx: ("GET", "/admin/login", {})),
+    ("POST /admin/login", False, "write",
+     lambda fx: ("POST", "/admin/login", {"data": {"username": ADMIN_USER[0], "password": ADMIN_USER[1]}})),
+    ("GET /admin/dashboard", True, "read", lambda fx: ("GET", "/admin/dashboard", {})),
+    ("GET /admin/api/products", True, "read", lambda fx: ("GET", "/admin/api/products", {})),
+    ("GET /admin/api/products?sort=name_en&page", True, "read", lambda fx: (
+        "GET", "/admin/api/products", {"params": {"sort": "name_en", "order": "asc", "page": fx.unique() % 200 + 1}})),
+    ("GET /admin/api/products?category_id&q", True, "read", lambda fx: (
+        "GET", "/admin/api/products", {"params": {"category_id": fx.category_ids[0], "q": "cocoa"}})),
+    ("GET /admin/users", True, "read", lambda fx: ("GET", "/admin/users", {})),
+    ("GET /admin/products/import", True, "read", lambda fx: ("GET", "/admin/products/import", {})),
+    ("GET /admin/products/export", True, "read", lambda fx: ("GET", "/admin/products/export", {})),
+    ("POST /admin/products/import", True, "write",
+     lambda fx: ("POST", "/admin/products/import", {"files": {"file": ("bench.csv", IMPORT_CSV.encode(), "text/csv")}})),
+    ("POST /admin/products/add", True, "write", lambda fx: ("POST", "/admin/products/add", {"data": {
+        "name_en": "Bench add", "name_ar": "إضافة", "code": f"BENCH-ADD-{fx.unique()}", "weight": "1 KG",
+        "category_id": fx.category_ids[0]}})),
+    ("POST /admin/products/edit/{id}", True, "write", lambda fx: (lambda pid: (
+        "POST", f"/admin/products/edit/{pid}", {"data": _edit_product_form(fx, pid)}))(
+        fx.product_ids[fx.unique() % len(fx.product_ids)])),
+    ("POST /admin/products/delete/{id}", True, ("pool", "products", "code", "BENCH-ADD-"),
+     lambda fx, item: ("POST", f"/admin/products/delete/{item}", {})),
+    ("POST /admin/categories/add", True, "write", lambda fx: ("POST", "/admin/categories/add", {"data": {
+        "name_en": "Bench category", "name_ar": "فئة", "slug": f"bench-category-{fx.unique()}"}})),
+    ("POST /admin/categories/edit/{id}", True, "write", lambda fx: (lambda cid: (
+        "POST", f"/admin/categories/edit/{cid}", {"data": {
+            "name_en": f"Edited {cid}", "name_ar": f"معدل {cid}", "slug": f"synthetic-edited-{cid}"}}))(
+        fx.category_ids[fx.unique() % len(fx.category_ids)])),
+    ("POST /admin/categories/delete/{id}", True, ("pool", "categories", "slug", "bench-category-"),
+     lambda fx, item: ("POST", f"/admin/categories/delete/{item}", {})),
+    ("POST /admin/users/add", True, "write", lambda fx: ("POST", "/admin/users/add", {"data": {
+        "username": f"bench-user-{fx.unique()}", "password": "bench-password", "role": "admin"}})),
+    ("POST /admin/users/delete/{id}", True, ("pool", "admins", "username", "bench-user-"),
+     lambda fx, item: ("POST", f"/admin/users/delete/{item}", {})),
+]
+
+
+async def _login(client):
+    response = await client.post("/admin/login", data={"username": ADMIN_USER[0], "password": ADMIN_USER[1]})
+    if response.status_code != 303:
+        raise RuntimeError(f"Admin login failed with {response.status_code}")
+
+
+async def measure(base_url, route, fx, args) -> dict:
+    name, needs_admin, kind, build = route
+    pool = None
+    if isinstance(kind, tuple):
+        pool = fx.created(*kind[1:])
+
+    latencies, errors = [], []
+    clients = [httpx.AsyncClient(base_url=base_url, timeout=60) for _ in range(args.concurrency)]
+    try:
+        if needs_admin:
+            await asyncio.gather(*(_login(client) for client in clients))
+
+        stop = time.monotonic() + args.seconds
+
+        async def worker(client):
+            while time.monotonic() < stop:
+                if pool is not None:
+                    if not pool:
+                        return
+                    method, url, kwargs = build(fx, pool.pop())
+                else:
+                    method, url, kwargs = build(fx)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, url, **kwargs)
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+                        continue
+                except httpx.HTTPError as exc:
+                    errors.append(type(exc).__name__)
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(client) for client in clients))
+        elapsed = time.monotonic() - started
+    finally:
+        for client in clients:
+            await client.aclose()
+
+    report = summarize(latencies, elapsed)
+    report["errors"] = len(errors)
+    return report
+
+
+async def run(base_url, args) -> dict:
+    fx = Fixtures()
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        fx.cursor = (await client.get("/api/products")).json().get("next_cursor")
+
+    results = {}
+    for route in ROUTES:
+        if args.only and not any(part in route[0] for part in args.only):
+            continue
+        results[route[0]] = await measure(base_url, route, fx, args)
+        print(f"{route[0]:<40} {_line(results[route[0]])}", file=sys.stderr)
+    return results
+
+
+def _line(stats: dict) -> str:
+    if not stats.get("requests"):
+        return f"no successful requests ({stats.get('errors', 0)} errors)"
+    return (f"{stats['rps']:>8.1f} rps  p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  "
+            f"p99 {stats['p99_ms']:>8.2f} ms  errors {stats.get('errors', 0)}")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    print(f"{'route':<40} {'p50 ms':>24}  {'p99 ms':>24}  {'rps':>24}")
+    for name, new in after["routes"].items():
+        old = before["routes"].get(name)
+        if not old or not old.get("requests") or not new.get("requests"):
+            continue
+        cells = []
+        for key in ("p50_ms", "p99_ms", "rps"):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f"{old[key]:>8.1f} → {new[key]:>8.1f} {change:+5.0f}%")
+        print(f"{name:<40} " + "  ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--images", type=int, default=12)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--only", action="append", help="run routes whose name contains this (repeatable)")
+    parser.add_argument("--cold", action="store_true", help="disable the public page cache")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two reports and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # The slow-request log would report most of the write routes here
+    env = {"VINES_SLOW_REQUEST_MS": "60000"}
+    if args.cold:
+        env["VINES_PAGE_CACHE_ENTRIES"] = "0"
+    with workspace():
+        prepare(args.products, args.categories, args.images)
+        with server(workers=args.workers, env=env) as base_url:
+            routes = asyncio.run(run(base_url, args))
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "routes": routes,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
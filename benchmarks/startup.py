@@ -0,0 +1,151 @@
+"""Cold start: import time and time to the first served page, checked against a budget.
+
+    python -m benchmarks.startup [--runs 5] [--products 10000] [--output report.json]
+                                 [--budget-import-ms 1000] [--budget-first-response-ms 1500]
+
+Seeds a throwaway database and fills the template bytecode cache the way a
+deploy would (python -m app.templating compile). Then, in fresh interpreters:
+
+- `import main` is timed, and so are startup and the first GET / through a
+  TestClient. The modules in DEFERRED must still not be loaded after that
+  request; they are for admin work and must load on first use.
+- `uvicorn main:app` is started, and the time from spawning it to the first
+  200 from / is measured. That is what a new worker or a scale-up from zero
+  costs.
+
+The medians are compared with the budgets. The exit status is 1 when any
+budget is exceeded or a deferred module was loaded, so CI can run this as a
+check. Timings depend on the machine, so set the budgets for the machine
+that runs it. Requires httpx (through benchmarks.routes).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.common import REPO_ROOT, free_port, workspace
+
+# Imported by admin features only (logins, tokens, spreadsheets, image resizing)
+DEFERRED = ("jose", "passlib", "cryptography", "openpyxl", "PIL")
+BUDGET_IMPORT_MS = 1000.0
+BUDGET_FIRST_RESPONSE_MS = 1500.0
+
+
+def child():
+    # Runs inside the workspace, in a fresh interpreter
+    started = time.perf_counter()
+    import main
+    imported = time.perf_counter()
+    from fastapi.testclient import TestClient
+
+    result = {"import_ms": (imported - started) * 1000}
+    with TestClient(main.app) as client:
+        ready = time.perf_counter()
+        result["startup_ms"] = (ready - imported) * 1000
+        client.get("/").raise_for_status()
+        result["first_request_ms"] = (time.perf_counter() - ready) * 1000
+        result["deferred_loaded"] = [name for name in DEFERRED if name in sys.modules]
+    print(json.dumps(result))
+
+
+def run_child(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child"],
+        env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def first_response_ms(env: dict, timeout: float = 30.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env={**os.environ, **env},
+    )
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                if process.poll() is not None or time.perf_counter() - started > timeout:
+                    raise RuntimeError("uvicorn did not serve /")
+                time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--budget-import-ms", type=float, default=BUDGET_IMPORT_MS)
+    parser.add_argument("--budget-first-response-ms", type=float, default=BUDGET_FIRST_RESPONSE_MS)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return 0
+
+    from benchmarks.routes import prepare
+
+    with workspace() as path:
+        prepare(args.products, 40, 4)
+        env = {
+            "PYTHONPATH": REPO_ROOT,
+            "VINES_ENV": "production",
+            "VINES_SLOW_REQUEST_MS": "60000",
+            "VINES_TEMPLATE_CACHE_DIR": tempfile.mkdtemp(dir=path),
+        }
+        subprocess.run([sys.executable, "-m", "app.templating", "compile"], env={**os.environ, **env},
+                       capture_output=True, check=True)
+        children = [run_child(env) for _ in range(args.runs)]
+        spawns = [first_response_ms(env) for _ in range(args.runs)]
+
+    summary = {
+        "import_ms": round(statistics.median(run["import_ms"] for run in children), 1),
+        "startup_ms": round(statistics.median(run["startup_ms"] for run in children), 1),
+        "first_request_ms": round(statistics.median(run["first_request_ms"] for run in children), 1),
+        "first_response_ms": round(statistics.median(spawns), 1),
+        "deferred_loaded": sorted({name for run in children for name in run["deferred_loaded"]}),
+    }
+    failures = []
+    if summary["import_ms"] > args.budget_import_ms:
+        failures.append(f"import {summary['import_ms']:.0f} ms > {args.budget_import_ms:.0f} ms")
+    if summary["first_response_ms"] > args.budget_first_response_ms:
+        failures.append(f"first response {summary['first_response_ms']:.0f} ms > {args.budget_first_response_ms:.0f} ms")
+    if summary["deferred_loaded"]:
+        failures.append(f"loaded before first use: {', '.join(summary['deferred_loaded'])}")
+
+    print(f"import {summary['import_ms']:.0f} ms, startup {summary['startup_ms']:.0f} ms, "
+          f"first GET / {summary['first_request_ms']:.0f} ms; "
+          f"spawn to first response {summary['first_response_ms']:.0f} ms", file=sys.stderr)
+    print("over budget: " + "; ".join(failures) if failures else "within budget", file=sys.stderr)
+
+    report = {
+        "meta": {"python": platform.python_version(), "runs": args.runs, "products": args.products},
+        "budget": {"import_ms": args.budget_import_ms, "first_response_ms": args.budget_first_response_ms},
+        "summary": summary,
+        "passed": not failures,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
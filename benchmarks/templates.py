@@ -0,0 +1,129 @@
+"""Cold-start template rendering: startup time and the first render of each page.
+
+    python -m benchmarks.templates [--runs 5] [--products 2000] [--output report.json]
+
+Every run is a fresh interpreter that imports the app, goes through startup
+and requests each page twice: the first request pays for loading and
+compiling its templates, the second shows the warm render. Runs are made
+twice: once with an empty template bytecode cache (a first deploy) and once
+with a cache filled by `python -m app.templating compile` beforehand. The
+public page cache is off so every request renders. Requires httpx.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import workspace
+
+PAGES = ["/", "/about", "/contact", "/products", "/products?search=chocolate", "/admin/login"]
+
+
+def child():
+    # Runs inside the workspace, in a fresh interpreter
+    import time
+    started = time.perf_counter()
+    import main
+    from fastapi.testclient import TestClient
+    imported = time.perf_counter()
+
+    result = {"import_ms": (imported - started) * 1000}
+    with TestClient(main.app) as client:
+        result["startup_ms"] = (time.perf_counter() - imported) * 1000
+        first, warm = {}, {}
+        for page in PAGES:
+            for timings in (first, warm):
+                began = time.perf_counter()
+                response = client.get(page)
+                timings[page] = (time.perf_counter() - began) * 1000
+                response.raise_for_status()
+    result["first_ms"] = first
+    result["warm_ms"] = warm
+    print(json.dumps(result))
+
+
+def run_once(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.templates", "--child"],
+        env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _median(runs, key, page=None):
+    values = [run[key][page] if page else run[key] for run in runs]
+    return round(statistics.median(values), 2)
+
+
+def summarize_runs(runs) -> dict:
+    return {
+        "import_ms": _median(runs, "import_ms"),
+        "startup_ms": _median(runs, "startup_ms"),
+        "first_ms": {page: _median(runs, "first_ms", page) for page in PAGES},
+        "warm_ms": {page: _median(runs, "warm_ms", page) for page in PAGES},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    from benchmarks.routes import prepare, REPO_ROOT
+
+    results = {}
+    with workspace() as path:
+        prepare(args.products, 40, 4)
+        env = {
+            "PYTHONPATH": REPO_ROOT,
+            "VINES_PAGE_CACHE_ENTRIES": "0",
+            "VINES_ENV": "production",
+            "VINES_SLOW_REQUEST_MS": "60000",
+        }
+
+        runs = []
+        for _ in range(args.runs):
+            with tempfile.TemporaryDirectory(dir=path) as cache_dir:
+                runs.append(run_once({**env, "VINES_TEMPLATE_CACHE_DIR": cache_dir}))
+        results["empty cache"] = summarize_runs(runs)
+
+        with tempfile.TemporaryDirectory(dir=path) as cache_dir:
+            env["VINES_TEMPLATE_CACHE_DIR"] = cache_dir
+            compiled = subprocess.run(
+                [sys.executable, "-m", "app.templating", "compile"], env={**os.environ, **env},
+                capture_output=True, text=True,
+            )
+            if compiled.returncode == 0:
+                results["precompiled"] = summarize_runs([run_once(env) for _ in range(args.runs)])
+            else:
+                print("app.templating compile unavailable; skipping the precompiled runs", file=sys.stderr)
+
+    for mode, summary in results.items():
+        print(f"{mode}: import {summary['import_ms']:.0f} ms, startup {summary['startup_ms']:.0f} ms", file=sys.stderr)
+        for page in PAGES:
+            print(f"  {page:<32} first {summary['first_ms'][page]:>8.2f} ms   warm {summary['warm_ms'][page]:>7.2f} ms",
+                  file=sys.stderr)
+
+    report = {
+        "meta": {"python": platform.python_version(), "runs": args.runs, "products": args.products},
+        "modes": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
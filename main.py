@@ -1,24 +1,72 @@
+import threading
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from app import models, database, auth
-from app.routers import public, admin
-
-models.Base.metadata.create_all(bind=database.engine)
+from app import settings, database, auth, search, catalog, instrumentation, images, assets, migrations, templating, compression, metrics, coordination, cache, jobs, tasks, i18n
+from app.routers import public, admin, api, monitoring
 
 app = FastAPI(title="The Vines Trading Company")
 
+# Per-request SQL / render / handler timings (Server-Timing header + slow log)
+instrumentation.instrument_engine(database.engine)
+instrumentation.instrument_engine(database.async_engine.sync_engine)
+instrumentation.instrument_engine(database.read_engine.sync_engine)
+app.add_middleware(instrumentation.TimingMiddleware)
+# Negotiated gzip/brotli for HTML, JSON and CSV responses
+app.add_middleware(compression.CompressionMiddleware)
+# /ar and /en page prefixes, or the language cookie, pick the language a page is rendered in
+app.add_middleware(i18n.LocaleMiddleware)
+
+# Other workers' writes: drop cached pages first, then rebuild the snapshot
+coordination.on_change("catalog", cache.page_cache.invalidate_catalog)
+coordination.on_change("catalog", catalog.reload_if_stale)
+coordination.on_change("auth", auth.reload_revocations)
+
 @app.on_event("startup")
 def on_startup():
-    db = database.SessionLocal()
-    try:
-        auth.create_super_admin_if_not_exists(db)
-    finally:
-        db.close()
+    # With several workers booting at once, one of them does the shared work at a time
+    with coordination.exclusive("bootstrap"):
+        # Schema changes are applied with `python -m app.migrations upgrade`, not here
+        migrations.check(database.engine)
+        search.ensure_index(database.engine)
+        db = database.SessionLocal()
+        try:
+            auth.create_super_admin_if_not_exists(db)
+        finally:
+            db.close()
+        metrics.start()
+    # Watch before loading, so no write falls between the two
+    coordination.start(database.engine)
+    auth.reload_revocations()
+    if settings.WARM_UP_IN_BACKGROUND:
+        # Serve straight away; pages that need the catalog wait for it meanwhile
+        threading.Thread(target=warm_up, name="vines-warm-up", daemon=True).start()
+    else:
+        warm_up()
+
+def warm_up():
+    catalog.current()
+    # Load every template now (from the bytecode cache when it is warm), not on first request
+    templating.precompile()
+
+@app.on_event("startup")
+async def start_jobs():
+    # Image processing, file cleanup and catalog refreshes queued by the admin (app/tasks.py)
+    await jobs.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await jobs.stop()
+    coordination.stop()
+    metrics.stop()
+    images.shutdown()
+    await database.dispose()
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Serves fingerprinted assets (python -m app.assets build) as immutable, precompressed
+app.mount("/static", assets.AssetStaticFiles(directory="app/static"), name="static")
 
-templates = Jinja2Templates(directory="app/templates")
+# One shared Jinja environment (app/templating.py) serves every router
+templates = templating.templates
 
 app.include_router(public.router)
 app.include_router(admin.router)
+app.include_router(api.router)
+app.include_router(monitoring.router)
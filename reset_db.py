@@ -1,8 +1,16 @@
 import os
+from app import migrations
+from app.database import engine
 
 db_path = "vines.db"
 if os.path.exists(db_path):
-    os.remove(db_path)
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
     print(f"Deleted {db_path} to reset credentials.")
 else:
     print(f"{db_path} not found.")
+
+migrations.upgrade(engine)
+print("Created an empty database at the latest schema version.")